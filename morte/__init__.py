@@ -1,4 +1,12 @@
 # Copyright 2022 ACCESS-NRI and contributors. See the top-level COPYRIGHT file for details.
 # SPDX-License-Identifier: Apache-2.0
 
-from .models import accessesm
+from .models import available_models, get_model, register_model
+
+
+def __getattr__(name):
+    # Load models lazily on attribute access, e.g. morte.accessesm. Models declared as entry
+    # points are not discovered here, as that is slow. Use get_model for these
+    if not name.startswith("_") and name in available_models():
+        return get_model(name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,244 @@
+# Copyright 2022 ACCESS-NRI and contributors. See the top-level COPYRIGHT file for details.
+# SPDX-License-Identifier: Apache-2.0
+
+"""
+In-memory caches of parsed manifests and file hashes that can be shared between checks
+"""
+
+import os
+import copy
+import json
+import logging
+import threading
+
+from yamanifest.manifest import Manifest as Yamanifest
+
+logger = logging.getLogger(__name__)
+log_handler = logging.StreamHandler()
+log_handler.setLevel(logging.INFO)
+log_format = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+log_handler.setFormatter(log_format)
+logger.addHandler(log_handler)
+
+
+def signature(path):
+    """
+    Return a signature of the stat information of a file that changes whenever the file is
+    modified or replaced. Returns None if the file does not exist
+
+    Parameters
+    ----------
+    path: str
+        Path to the file
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return [stat.st_size, stat.st_mtime_ns, stat.st_ino]
+
+
+class ManifestCache:
+    """
+    Class for keeping parsed yamanifest files in memory. Files are reparsed whenever their
+    signature changes
+    """
+
+    def __init__(self):
+        """
+        Initialise a ManifestCache object.
+        """
+
+        self._manifests = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._manifests)
+
+    def load(self, manifest):
+        """
+        Load the header and data of a yamanifest file into a Manifest object, parsing the file
+        only if it has changed since it was last loaded
+
+        Parameters
+        ----------
+        manifest: yamanifest.manifest.Manifest
+            The Manifest object to load into. The path of the Manifest is the file loaded
+        """
+        path = os.path.abspath(manifest.path)
+        sig = signature(path)
+
+        with self._lock:
+            cached = self._manifests.get(path)
+        if cached is None or cached[0] != sig:
+            loaded = Yamanifest(path).load()
+            cached = (sig, loaded.header, loaded.data)
+            with self._lock:
+                self._manifests[path] = cached
+
+        # Copy so that changes to the manifest do not leak into the cache
+        manifest.header = copy.deepcopy(cached[1])
+        manifest.data = copy.deepcopy(cached[2])
+        return manifest
+
+
+class HashCache:
+    """
+    Class for keeping the hashes of files in memory. Hashes are invalidated whenever the
+    signature of their file changes
+    """
+
+    def __init__(self):
+        """
+        Initialise a HashCache object.
+        """
+
+        self._hashes = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._hashes)
+
+    def get(self, fullpath):
+        """
+        Return the cached hashes of a file, or None if there are no hashes or the file has
+        changed since they were cached
+
+        Parameters
+        ----------
+        fullpath: str
+            Path to the file
+        """
+        with self._lock:
+            cached = self._hashes.get(os.path.abspath(fullpath))
+        if cached is None or cached[0] != signature(fullpath):
+            return None
+        return dict(cached[1])
+
+    def put(self, fullpath, hashes, sig=None):
+        """
+        Cache the hashes of a file
+
+        Parameters
+        ----------
+        fullpath: str
+            Path to the file
+        hashes: dict
+            The hashes of the file, keyed by hash function
+        sig: list, optional
+            The signature of the file when it was hashed. If None, use its current signature
+        """
+        if sig is None:
+            sig = signature(fullpath)
+        if sig is None:
+            return
+        with self._lock:
+            self._put(os.path.abspath(fullpath), sig, dict(hashes))
+
+    def invalidate(self, fullpath):
+        """
+        Remove the cached hashes of a file, e.g. because it has been rewritten. A rewritten
+        file can keep its signature if its size is unchanged and it is rewritten in place
+        within the resolution of the filesystem's modification times
+
+        Parameters
+        ----------
+        fullpath: str
+            Path to the file
+        """
+        with self._lock:
+            self._invalidate(os.path.abspath(fullpath))
+
+    def _put(self, fullpath, sig, hashes):
+        self._hashes[fullpath] = (sig, hashes)
+
+    def _invalidate(self, fullpath):
+        self._hashes.pop(fullpath, None)
+
+
+class Journal(HashCache):
+    """
+    Hash cache that also records each hash in a journal file as soon as it is added. A check
+    that is interrupted can be restarted with the same journal file and only files that have
+    changed, or had not been hashed yet, are hashed again. The journal is only intended to
+    last until the check completes, after which it should be removed with remove
+    """
+
+    def __init__(self, file):
+        """
+        Initialise a Journal object, loading any hashes already recorded in the journal file.
+
+        Parameters
+        ----------
+        file : str
+            Path to the journal file. Created if it does not exist
+        """
+        super().__init__()
+
+        self.file = file
+
+        contents = ""
+        if os.path.isfile(self.file):
+            with open(self.file, "r") as f:
+                contents = f.read()
+
+        lines = contents.splitlines()
+        for line in lines:
+            try:
+                record = json.loads(line)
+                if record["hashes"] is None:
+                    # The file was invalidated
+                    self._hashes.pop(record["fullpath"], None)
+                else:
+                    self._hashes[record["fullpath"]] = (
+                        record["signature"],
+                        record["hashes"],
+                    )
+            except (ValueError, KeyError):
+                # E.g. a partially written record from an interrupted check
+                logger.warning(f"Skipping invalid record in journal {self.file}")
+
+        # Drop superseded and invalid records so that the journal does not grow forever and
+        # new records are not appended to a partially written line
+        if contents and (len(lines) > len(self._hashes) or not contents.endswith("\n")):
+            self.compact()
+
+    def compact(self):
+        """
+        Rewrite the journal file with only the latest record for each file
+        """
+        with self._lock:
+            tmp_file = f"{self.file}.tmp"
+            with open(tmp_file, "w") as f:
+                for fullpath, (sig, hashes) in self._hashes.items():
+                    f.write(_record(fullpath, sig, hashes))
+            os.replace(tmp_file, self.file)
+
+    def remove(self):
+        """
+        Remove the journal file and forget all hashes, e.g. once the check has completed
+        """
+        with self._lock:
+            self._hashes.clear()
+            try:
+                os.remove(self.file)
+            except FileNotFoundError:
+                pass
+
+    def _put(self, fullpath, sig, hashes):
+        super()._put(fullpath, sig, hashes)
+        with open(self.file, "a") as f:
+            f.write(_record(fullpath, sig, hashes))
+
+    def _invalidate(self, fullpath):
+        if fullpath in self._hashes:
+            super()._invalidate(fullpath)
+            with open(self.file, "a") as f:
+                f.write(_record(fullpath, None, None))
+
+
+def _record(fullpath, sig, hashes):
+    """
+    Return a line of the journal file
+    """
+    return json.dumps({"fullpath": fullpath, "signature": sig, "hashes": hashes}) + "\n"
@@ -0,0 +1,199 @@
+# Copyright 2022 ACCESS-NRI and contributors. See the top-level COPYRIGHT file for details.
+# SPDX-License-Identifier: Apache-2.0
+
+"""
+Command line interface for morte
+"""
+
+import sys
+import json
+import argparse
+
+from .models import available_models
+
+
+def _run(args):
+    """
+    Check all experiments in the provided config files
+    """
+    import yaml
+
+    from .instrument import dump_trace
+    from .runner import Runner, load_experiments
+
+    runner = Runner(
+        jobs=args.jobs,
+        hash_procs=args.hash_procs,
+        max_io=args.max_io,
+        journal_dir=args.journal_dir,
+    )
+    try:
+        experiments = [
+            experiment
+            for config in args.config
+            for experiment in load_experiments(config)
+        ]
+        report = runner.run(experiments, dry_run=args.dry_run)
+    except ValueError as e:
+        sys.stderr.write(f"morte: error: {e}\n")
+        return 2
+
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(yaml.dump(report, default_flow_style=False))
+    else:
+        sys.stdout.write(yaml.dump(report, default_flow_style=False))
+
+    if args.trace:
+        dump_trace(args.trace, runner.trace_events())
+
+    failed = report["summary"].get("fail", 0) + report["summary"].get("error", 0)
+    return 1 if failed else 0
+
+
+def _models(args):
+    """
+    List the available models
+    """
+    sys.stdout.write("\n".join(available_models(entry_points=True)) + "\n")
+    return 0
+
+
+def _serve(args):
+    """
+    Run the verification service until it is shut down
+    """
+    from .service import Server
+
+    with Server(args.socket, numproc=args.hash_procs) as server:
+        server.serve_forever()
+    return 0
+
+
+def _request(args):
+    """
+    Send a compare or update request to the verification service
+    """
+    from .service import Client
+
+    client = Client(args.socket)
+    if args.command == "compare":
+        different = client.compare(
+            args.model, args.base_dir, args.reference_dir, args.reference_file
+        )
+    else:
+        different = client.update(
+            args.model,
+            args.base_dir,
+            args.reference_dir,
+            args.reference_file,
+            output_files=args.files,
+        )
+    sys.stdout.write(json.dumps({"different": different}) + "\n")
+    return 1 if different else 0
+
+
+def main(argv=None):
+    """
+    Entry point for the morte console script
+    """
+    parser = argparse.ArgumentParser(
+        prog="morte", description="Model Output Regression Testing"
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run = subparsers.add_parser(
+        "run", help="Check multiple experiments concurrently and report the results"
+    )
+    run.add_argument(
+        "config", nargs="+", help="Yaml file(s) listing the experiments to check"
+    )
+    run.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=None,
+        help="Maximum number of experiments to check at once (default: number of CPUs)",
+    )
+    run.add_argument(
+        "--hash-procs",
+        type=int,
+        default=None,
+        help="Total number of hashing processes shared between experiments (default: number of CPUs)",
+    )
+    run.add_argument(
+        "--max-io",
+        type=int,
+        default=None,
+        help="Maximum number of hashing/copying phases to run at once across all experiments",
+    )
+    run.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Only report how each file would be compared and the bytes that would be read and written",
+    )
+    run.add_argument(
+        "--journal-dir",
+        default=None,
+        help="Keep journals of computed hashes in this directory so that interrupted runs can be resumed. "
+        "Journals are removed once their experiment has been checked without errors",
+    )
+    run.add_argument(
+        "-o", "--output", default=None, help="Write the yaml report to this file"
+    )
+    run.add_argument(
+        "--trace", default=None, help="Write a json trace of all checks to this file"
+    )
+    run.set_defaults(func=_run)
+
+    models = subparsers.add_parser("models", help="List the available models")
+    models.set_defaults(func=_models)
+
+    socket_help = "Path to the Unix socket of the verification service (default: $MORTE_SOCKET or ~/.morte.sock)"
+
+    serve = subparsers.add_parser(
+        "serve",
+        help="Run a verification service that keeps reference manifests and hashes in memory",
+    )
+    serve.add_argument("--socket", default=None, help=socket_help)
+    serve.add_argument(
+        "--hash-procs",
+        type=int,
+        default=None,
+        help="Number of hashing processes (default: number of CPUs)",
+    )
+    serve.set_defaults(func=_serve)
+
+    for command, help in [
+        (
+            "compare",
+            "Compare model output to reference files using the verification service",
+        ),
+        (
+            "update",
+            "Update reference files from model output using the verification service",
+        ),
+    ]:
+        request = subparsers.add_parser(command, help=help)
+        request.add_argument("model", help="Name of the model, e.g. accessesm")
+        request.add_argument("base_dir", help="Base directory of the model experiment")
+        request.add_argument(
+            "reference_dir", help="Directory containing the reference files"
+        )
+        request.add_argument("reference_file", help="Path to the reference manifest")
+        request.add_argument("--socket", default=None, help=socket_help)
+        if command == "update":
+            request.add_argument(
+                "--files",
+                nargs="+",
+                default=None,
+                help="Output files to update (default: all)",
+            )
+        request.set_defaults(func=_request)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,276 @@
+# Copyright 2022 ACCESS-NRI and contributors. See the top-level COPYRIGHT file for details.
+# SPDX-License-Identifier: Apache-2.0
+
+"""
+Tools for timing the phases of a check and tracking the I/O they perform
+"""
+
+import os
+import json
+import time
+import threading
+from contextlib import contextmanager
+
+
+class Phase:
+    """
+    Class for recording the wall time and I/O of a single phase of a check
+    """
+
+    def __init__(self, name, start, **args):
+        """
+        Initialise a Phase object.
+
+        Parameters
+        ----------
+        name : str
+            The name of the phase, e.g. "update_manifest"
+        start : float
+            The start time of the phase in seconds, as returned by time.perf_counter
+        args : dict, optional
+            Additional information to attach to the phase, e.g. the file being copied
+        """
+
+        self.name = name
+        self.start = start
+        self.duration = None
+        self.args = args
+
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.files = {}
+        self.durations = {}
+
+        self.pid = os.getpid()
+        self.tid = threading.get_ident()
+
+    def read(self, *paths, limit=None):
+        """
+        Record that files were read during this phase
+
+        Parameters
+        ----------
+        paths: str
+            Paths to the files that were read
+        limit: int, optional
+            The maximum number of bytes read from each file. If None, the whole file was read
+        """
+        for path in paths:
+            nbytes = _size(path, limit)
+            self.bytes_read += nbytes
+            self.files[str(path)] = self.files.get(str(path), 0) + nbytes
+
+    def written(self, *paths):
+        """
+        Record that files were written during this phase
+
+        Parameters
+        ----------
+        paths: str
+            Paths to the files that were written
+        """
+        for path in paths:
+            nbytes = _size(path)
+            self.bytes_written += nbytes
+            self.files[str(path)] = self.files.get(str(path), 0) + nbytes
+
+    def timed(self, path, duration):
+        """
+        Record the time spent on a single file during this phase, e.g. hashing it in a worker
+        process, so that the throughput of each file can be reported
+
+        Parameters
+        ----------
+        path: str
+            Path to the file
+        duration: float
+            The time spent on the file in seconds
+        """
+        self.durations[str(path)] = self.durations.get(str(path), 0.0) + duration
+
+    @property
+    def throughput(self):
+        """
+        The rate of I/O during this phase in bytes per second
+        """
+        if not self.duration:
+            return None
+        return (self.bytes_read + self.bytes_written) / self.duration
+
+    def to_dict(self):
+        """
+        Return a dictionary summarising this phase
+        """
+        return {
+            "name": self.name,
+            "duration": self.duration,
+            "bytes read": self.bytes_read,
+            "bytes written": self.bytes_written,
+            "throughput": self.throughput,
+            "files": {path: self._file_info(path) for path in self.files},
+            **self.args,
+        }
+
+    def _file_info(self, path):
+        """
+        Return a dictionary summarising the I/O of a single file during this phase
+        """
+        info = {"bytes": self.files[path]}
+        if path in self.durations:
+            info["duration"] = self.durations[path]
+            info["throughput"] = (
+                info["bytes"] / info["duration"] if info["duration"] else None
+            )
+        return info
+
+
+class Instrumentation:
+    """
+    Class for collecting the timing and I/O of the phases of a check
+    """
+
+    def __init__(self, origin=None):
+        """
+        Initialise an Instrumentation object.
+
+        Parameters
+        ----------
+        origin : float, optional
+            The time, as returned by time.perf_counter, that trace event timestamps are relative
+            to. Share this between Instrumentation objects to combine their traces. If None, use
+            the current time
+        """
+
+        self.phases = []
+        self.hooks = []
+
+        self.origin = time.perf_counter() if origin is None else origin
+        self._lock = threading.Lock()
+
+    def add_hook(self, hook):
+        """
+        Add a hook to be called with each Phase object as it completes
+
+        Parameters
+        ----------
+        hook: callable
+            Function taking a single Phase argument
+        """
+        self.hooks.append(hook)
+
+    @contextmanager
+    def phase(self, name, **args):
+        """
+        Context manager for timing a phase of a check. Yields the Phase object so that the I/O
+        performed within the phase can be recorded
+
+        Parameters
+        ----------
+        name : str
+            The name of the phase
+        args : dict, optional
+            Additional information to attach to the phase
+        """
+        phase = Phase(name, time.perf_counter(), **args)
+        try:
+            yield phase
+        finally:
+            phase.duration = time.perf_counter() - phase.start
+            with self._lock:
+                self.phases.append(phase)
+            for hook in self.hooks:
+                hook(phase)
+
+    def summary(self):
+        """
+        Return the total wall time and I/O of all completed phases, grouped by phase name
+        """
+        summary = {}
+        for phase in self.phases:
+            info = summary.setdefault(
+                phase.name,
+                {"count": 0, "duration": 0.0, "bytes read": 0, "bytes written": 0},
+            )
+            info["count"] += 1
+            info["duration"] += phase.duration
+            info["bytes read"] += phase.bytes_read
+            info["bytes written"] += phase.bytes_written
+        for info in summary.values():
+            nbytes = info["bytes read"] + info["bytes written"]
+            info["throughput"] = nbytes / info["duration"] if info["duration"] else None
+        return summary
+
+    def trace_events(self, tid=None):
+        """
+        Return the completed phases as a list of events in the Trace Event Format, see
+        https://docs.google.com/document/d/1CvAClvFfyA5R-PhYUmn5OOQtYMH4h6I0nSsKchNAySU
+
+        Parameters
+        ----------
+        tid : int, optional
+            The thread id to give all events. If None, use the id of the thread that ran each
+            phase
+        """
+        return [
+            {
+                "name": phase.name,
+                "cat": "morte",
+                "ph": "X",
+                "ts": (phase.start - self.origin) * 1e6,
+                "dur": phase.duration * 1e6,
+                "pid": phase.pid,
+                "tid": phase.tid if tid is None else tid,
+                "args": {
+                    key: val for key, val in phase.to_dict().items() if key != "name"
+                },
+            }
+            for phase in self.phases
+        ]
+
+    def dump(self, file):
+        """
+        Dump the completed phases to a json file that can be loaded into a trace viewer, e.g.
+        chrome://tracing or https://ui.perfetto.dev
+
+        Parameters
+        ----------
+        file: str
+            Path to the json file to write
+        """
+        dump_trace(file, self.trace_events(), {"summary": self.summary()})
+
+
+def dump_trace(file, events, other_data=None):
+    """
+    Dump a list of trace events to a json file that can be loaded into a trace viewer
+
+    Parameters
+    ----------
+    file: str
+        Path to the json file to write
+    events: list
+        The trace events, e.g. as returned by Instrumentation.trace_events
+    other_data: dict, optional
+        Additional metadata to include in the trace file
+    """
+    with open(file, "w") as f:
+        json.dump(
+            {
+                "traceEvents": events,
+                "displayTimeUnit": "ms",
+                "otherData": {} if other_data is None else other_data,
+            },
+            f,
+            indent=2,
+        )
+
+
+def _size(path, limit=None):
+    """
+    Return the size of a file in bytes, capped at limit. Returns 0 if the file does not exist
+    """
+    try:
+        size = os.path.getsize(path)
+    except OSError:
+        return 0
+    return size if limit is None else min(size, limit)
@@ -0,0 +1,174 @@
+# Copyright 2022 ACCESS-NRI and contributors. See the top-level COPYRIGHT file for details.
+# SPDX-License-Identifier: Apache-2.0
+
+"""
+Tools for safely sharing reference files between concurrent checks: inter-process file locks
+and atomic (write-temp-then-rename) file writes
+"""
+
+import os
+import fcntl
+import shutil
+import secrets
+import threading
+from contextlib import contextmanager
+
+
+class FileLock:
+    """
+    Class for holding an advisory lock on a file, shared between processes. The lock is
+    reentrant, so can be acquired again by code that already holds it
+    """
+
+    def __init__(self, path):
+        """
+        Initialise a FileLock object.
+
+        Parameters
+        ----------
+        path : str
+            Path to the lock file. Created if it does not exist, with the permissions a new
+            file would have so that, e.g., other group members can also take the lock
+        """
+
+        self.path = path
+
+        self._fd = None
+        self._depth = 0
+        self._lock = threading.RLock()
+
+    def acquire(self, shared=False):
+        """
+        Acquire the lock, blocking until it is available
+
+        Parameters
+        ----------
+        shared: boolean, optional
+            If True, acquire a shared (read) lock that can be held by multiple checks at once.
+            An existing lock file is opened read-only, so shared locks can be taken on
+            read-only reference stores. Otherwise acquire an exclusive (write) lock. If the
+            lock is already held, it is not changed
+        """
+        self._lock.acquire()
+        if self._depth == 0:
+            try:
+                fd = _open(self.path, shared)
+            except BaseException:
+                self._lock.release()
+                raise
+            try:
+                fcntl.flock(fd, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+            except BaseException:
+                os.close(fd)
+                self._lock.release()
+                raise
+            self._fd = fd
+        self._depth += 1
+
+    def release(self):
+        """
+        Release the lock
+        """
+        self._depth -= 1
+        if self._depth == 0:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+            self._fd = None
+        self._lock.release()
+
+    @contextmanager
+    def shared(self):
+        """
+        Context manager for holding a shared lock
+        """
+        self.acquire(shared=True)
+        try:
+            yield self
+        finally:
+            self.release()
+
+    @contextmanager
+    def exclusive(self):
+        """
+        Context manager for holding an exclusive lock
+        """
+        self.acquire(shared=False)
+        try:
+            yield self
+        finally:
+            self.release()
+
+
+@contextmanager
+def atomic_write(path, mode="w"):
+    """
+    Context manager for writing a file atomically. Yields a file object for a temporary file
+    in the same directory, which replaces path once the context exits without error. Readers
+    therefore only ever see the old or new file, never a partially written one. If path
+    already exists, its permissions are kept.
+
+    Parameters
+    ----------
+    path: str
+        Path to the file to write
+    mode: str, optional
+        The mode to open the temporary file with, "w" or "wb"
+    """
+    tmp_path = _temporary_file(path)
+    try:
+        with open(tmp_path, mode) as f:
+            yield f
+        if os.path.exists(path):
+            shutil.copymode(path, tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+def atomic_copy(src, dst):
+    """
+    Copy a file atomically, so that readers of dst only ever see the old or new file
+
+    Parameters
+    ----------
+    src: str
+        Path to the file to copy
+    dst: str
+        Path to copy the file to
+    """
+    tmp_path = _temporary_file(dst)
+    try:
+        shutil.copy(src, tmp_path)
+        os.replace(tmp_path, dst)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+def _temporary_file(path):
+    """
+    Create an empty temporary file alongside path, with the permissions a new file would have
+    """
+    directory, name = os.path.split(os.path.abspath(path))
+    while True:
+        tmp_path = os.path.join(directory, f".{name}.{secrets.token_hex(4)}.tmp")
+        try:
+            # The umask is applied to the mode, as for any new file
+            fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666)
+        except FileExistsError:
+            continue
+        os.close(fd)
+        return tmp_path
+
+
+def _open(path, shared):
+    """
+    Open a lock file, read-only for shared locks if it already exists
+    """
+    if shared:
+        try:
+            return os.open(path, os.O_RDONLY)
+        except FileNotFoundError:
+            pass
+    return os.open(path, os.O_RDWR | os.O_CREAT, 0o666)
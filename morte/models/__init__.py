@@ -1,2 +1,128 @@
 # Copyright 2022 ACCESS-NRI and contributors. See the top-level COPYRIGHT file for details.
 # SPDX-License-Identifier: Apache-2.0
+
+"""
+Registry of model interfaces. Models are only imported when they are first requested, so
+that importing morte and discovering the available models is cheap. Built-in and registered
+models are also available lazily as attributes, e.g. morte.models.accessesm.
+
+A model is any module or object with PerformanceInfo and ReproducibilityInfo classes. Their
+constructors must accept the same arguments as BasePerformanceInfo and
+BaseReproducibilityInfo in morte.models.base, including the optional keyword arguments
+(instrumentation, numproc, io_limiter, manifest_cache, hash_cache, dry_run and hash_pool)
+that the runner and service pass. The simplest way is to subclass the base classes and pass
+any **kwargs on to them, as morte.models.accessesm does.
+
+Models outside of morte can be registered with register_model or by declaring an entry
+point in the "morte.models" group, e.g. in setup.cfg::
+
+    [entry_points]
+    morte.models =
+        accessom = mypackage.accessom
+"""
+
+import importlib
+import threading
+from functools import reduce
+
+ENTRY_POINT_GROUP = "morte.models"
+
+# Models are stored either as an import path ("module" or "module:object"), or once loaded
+# as the model module/object itself. Names are also attributes of morte, so must not clash
+# with its subpackages (e.g. morte.test)
+_models = {
+    "accessesm": "morte.models.accessesm",
+    "testing": "morte.models.test",
+}
+_entry_points_loaded = False
+_lock = threading.RLock()
+
+
+def register_model(name, model):
+    """
+    Register a model interface
+
+    Parameters
+    ----------
+    name: str
+        The name of the model, e.g. "accessom"
+    model: str or module
+        The model module (or object), or the import path to it in the form "module" or
+        "module:object". Import paths are only imported when the model is first requested
+    """
+    with _lock:
+        _models[name] = model
+
+
+def available_models(entry_points=False):
+    """
+    Return a sorted list of the names of the available models, without importing them
+
+    Parameters
+    ----------
+    entry_points: boolean, optional
+        If True, also include models declared as entry points. Discovering entry points
+        requires scanning all installed distributions, so is only done once and only when
+        requested. Otherwise, only the built-in and registered models (and any entry points
+        already discovered) are included
+    """
+    with _lock:
+        if entry_points:
+            _load_entry_points()
+        return sorted(_models)
+
+
+def get_model(name):
+    """
+    Return the interface for a model, importing it if necessary
+
+    Parameters
+    ----------
+    name: str
+        The name of the model, e.g. "accessesm"
+    """
+    with _lock:
+        if name not in _models:
+            _load_entry_points()
+        if name not in _models:
+            raise ValueError(
+                f"Unknown model {name}. Available models are: {', '.join(sorted(_models))}"
+            )
+
+        model = _models[name]
+        if isinstance(model, str):
+            module, _, attrs = model.partition(":")
+            model = importlib.import_module(module)
+            if attrs:
+                model = reduce(getattr, attrs.split("."), model)
+            _models[name] = model
+        return model
+
+
+def _load_entry_points():
+    """
+    Add models declared as entry points to the registry, without loading them. Models
+    registered explicitly take precedence over entry points with the same name
+    """
+    global _entry_points_loaded
+    if _entry_points_loaded:
+        return
+
+    from importlib.metadata import entry_points
+
+    eps = entry_points()
+    if hasattr(eps, "select"):
+        eps = eps.select(group=ENTRY_POINT_GROUP)
+    else:  # Python < 3.10
+        eps = eps.get(ENTRY_POINT_GROUP, [])
+
+    for ep in eps:
+        _models.setdefault(ep.name, ep.value)
+    _entry_points_loaded = True
+
+
+def __getattr__(name):
+    # Load models lazily on attribute access, e.g. morte.models.accessesm
+    if not name.startswith("_") and name in available_models():
+        return get_model(name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
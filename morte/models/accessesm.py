@@ -12,8 +12,8 @@ from ..parse import YamlFile
 
 
 class PerformanceInfo(BasePerformanceInfo):
-    def __init__(self, base_dir, reference_file):
-        super().__init__(base_dir, reference_file)
+    def __init__(self, base_dir, reference_file, **kwargs):
+        super().__init__(base_dir, reference_file, **kwargs)
 
         # Payu config contains some useful info
         config = YamlFile(os.path.join(self.base_dir, "config.yaml"))
@@ -29,8 +29,8 @@ class PerformanceInfo(BasePerformanceInfo):
 
 
 class ReproducibilityInfo(BaseReproducibilityInfo):
-    def __init__(self, base_dir, reference_dir, manifest_file):
-        super().__init__(base_dir, reference_dir, manifest_file)
+    def __init__(self, base_dir, reference_dir, manifest_file, **kwargs):
+        super().__init__(base_dir, reference_dir, manifest_file, **kwargs)
 
         self.output_files = [
             "archive/restart000/atmosphere/restart_dump.astart",
@@ -6,14 +6,22 @@ Generic model class, primarily to be inherited by other models.
 """
 
 import os
-import shutil
+import glob
+import time
 import logging
+import multiprocessing as mp
+from contextlib import nullcontext
 
 import yaml
 
 from yamanifest.manifest import Manifest as Yamanifest
+from yamanifest.hashing import hash as yamanifest_hash, one_hundred_megabytes
 
 from ..parse import parse_pbs_summary
+from ..lock import FileLock, atomic_copy, atomic_write
+from ..cache import signature
+from ..planner import SIZE_MISMATCH, plan_comparison
+from ..instrument import Instrumentation
 
 logger = logging.getLogger(__name__)
 log_handler = logging.StreamHandler()
@@ -23,6 +31,8 @@ log_handler.setFormatter(log_format)
 logger.addHandler(log_handler)
 
 YAMANIFEST_HASH = "binhash-nomtime"
+# The binhash hashes only read up to the first 100 MB of each file
+YAMANIFEST_HASH_READ_LIMIT = one_hundred_megabytes
 
 
 class BasePerformanceInfo:
@@ -30,7 +40,7 @@ class BasePerformanceInfo:
     Generic class for keeping track of performance information parsed from model output
     """
 
-    def __init__(self, base_dir, reference_file):
+    def __init__(self, base_dir, reference_file, instrumentation=None):
         """
         Initialise a BasePerformanceInfo object.
 
@@ -40,6 +50,8 @@ class BasePerformanceInfo:
             Path to base directory of the model test experiment
         reference_file : str
             Path to yaml file containing reference performance information
+        instrumentation : morte.instrument.Instrumentation, optional
+            Object for recording the time and I/O of each phase. If None, a new one is created
         """
 
         self.base_dir = base_dir
@@ -59,24 +71,32 @@ class BasePerformanceInfo:
 
         self.pbs_output_file = "*.o*"
 
+        # Keep track of the time and I/O of each phase
+        if instrumentation is None:
+            instrumentation = Instrumentation()
+        self.instrumentation = instrumentation
+
     def setup(self):
 
-        # Always parse PBS summary
-        self.current_info["PBS summary"] = parse_pbs_summary(
-            os.path.join(self.base_dir, self.pbs_output_file)
-        )
+        with self.instrumentation.phase("setup"):
+            # Always parse PBS summary
+            pbs_output_file = os.path.join(self.base_dir, self.pbs_output_file)
+            with self.instrumentation.phase("parse_pbs_summary") as phase:
+                self.current_info["PBS summary"] = parse_pbs_summary(pbs_output_file)
+                phase.read(*glob.glob(pbs_output_file))
 
-        self.parse_info()
+            with self.instrumentation.phase("parse_info"):
+                self.parse_info()
 
-        # Set up the reference manifest
-        if self.has_reference_file:
-            self.load()
-        else:
-            logger.warning(
-                "Reference file does not exist. Generating from current performance info"
-            )
-            self.reference_info = self.current_info
-            self.dump_and_maybe_commit("Initial commit")
+            # Set up the reference manifest
+            if self.has_reference_file:
+                self.load()
+            else:
+                logger.warning(
+                    "Reference file does not exist. Generating from current performance info"
+                )
+                self.reference_info = self.current_info
+                self.dump_and_maybe_commit("Initial commit")
 
     def parse_info(self):
         """
@@ -96,8 +116,10 @@ class BasePerformanceInfo:
         Load performance info from yaml file
         """
         try:
-            with open(self.reference_file, "r") as file:
-                self.reference_info = yaml.safe_load(file)
+            with self.instrumentation.phase("load") as phase:
+                with open(self.reference_file, "r") as file:
+                    self.reference_info = yaml.safe_load(file)
+                phase.read(self.reference_file)
         except Exception:
             logger.exception(f"The file {file} does not exist to be parsed")
             raise
@@ -106,8 +128,11 @@ class BasePerformanceInfo:
         """
         Dump the performance info from yaml file and commit if in a github repo
         """
-        with open(self.reference_file, "w") as file:
-            file.write(yaml.dump(self.reference_info, default_flow_style=False))
+        with FileLock(f"{self.reference_file}.lock").exclusive():
+            with self.instrumentation.phase("dump") as phase:
+                with atomic_write(self.reference_file) as file:
+                    file.write(yaml.dump(self.reference_info, default_flow_style=False))
+                phase.written(self.reference_file)
 
 
 class BaseReproducibilityInfo:
@@ -115,7 +140,19 @@ class BaseReproducibilityInfo:
     Generic class for keeping track of checksums/hashes of model output files
     """
 
-    def __init__(self, base_dir, reference_dir, reference_file):
+    def __init__(
+        self,
+        base_dir,
+        reference_dir,
+        reference_file,
+        instrumentation=None,
+        numproc=None,
+        io_limiter=None,
+        manifest_cache=None,
+        hash_cache=None,
+        dry_run=False,
+        hash_pool=None,
+    ):
         """
         Initialise a BaseReproducibilityInfo object.
 
@@ -127,6 +164,26 @@ class BaseReproducibilityInfo:
             Path to directory containing reference datasets (often called "Known Good Outputs")
         reference_file : str
             Path to yamanifest file containing hashes/checksums of reference datasets
+        instrumentation : morte.instrument.Instrumentation, optional
+            Object for recording the time and I/O of each phase. If None, a new one is created
+        numproc : int, optional
+            The number of processes to use for hashing. If None, use one per CPU. Ignored if
+            hash_pool is provided
+        io_limiter : context manager, optional
+            Context manager entered around each I/O-heavy phase (hashing and copying), e.g. a
+            threading.BoundedSemaphore shared between checks to limit their concurrent I/O
+        manifest_cache : morte.cache.ManifestCache, optional
+            Cache to load the reference manifest from, so that it is only parsed when changed
+        hash_cache : morte.cache.HashCache, optional
+            Cache of file hashes, so that only files that have changed since they were last
+            hashed are rehashed
+        dry_run : boolean, optional
+            If True, setup only plans how each output file will be compared (see
+            comparison_plan) without copying, hashing or writing any files
+        hash_pool : multiprocessing.pool.Pool, optional
+            Process pool to hash files with, e.g. shared between checks so that their hashing
+            uses a bounded number of processes. If None, a new pool is started for each batch
+            of files to hash
         """
 
         self.base_dir = base_dir
@@ -136,8 +193,9 @@ class BaseReproducibilityInfo:
         self.output_files = []
 
         # Make sure directories exists
-        os.makedirs(self.reference_dir, exist_ok=True)
-        os.makedirs(os.path.dirname(self.reference_file), exist_ok=True)
+        if not dry_run:
+            os.makedirs(self.reference_dir, exist_ok=True)
+            os.makedirs(os.path.dirname(self.reference_file), exist_ok=True)
 
         if os.path.isfile(self.reference_file):
             self.has_reference_file = True
@@ -145,51 +203,145 @@ class BaseReproducibilityInfo:
             self.has_reference_file = False
 
         # Initialise the reference and current manifests
-        self.reference_manifest = Yamanifest(self.reference_file, [YAMANIFEST_HASH])
-        self.current_manifest = Yamanifest(None, [YAMANIFEST_HASH])
+        manifest_kwargs = {} if numproc is None else {"numproc": numproc}
+        self.reference_manifest = Yamanifest(
+            self.reference_file, [YAMANIFEST_HASH], **manifest_kwargs
+        )
+        self.current_manifest = Yamanifest(None, [YAMANIFEST_HASH], **manifest_kwargs)
 
-    def setup(self):
+        # Keep track of the time and I/O of each phase
+        if instrumentation is None:
+            instrumentation = Instrumentation()
+        self.instrumentation = instrumentation
 
-        if self.has_reference_file:
-            self.reference_manifest.load()
+        self.io_limiter = nullcontext() if io_limiter is None else io_limiter
 
-        # Make sure all reference files ("KGO"s) exist
-        outputs_missing_references = [
-            output
-            for output in self.output_files
-            if not os.path.isfile(os.path.join(self.reference_dir, output))
-        ]
-        if outputs_missing_references:
-            logger.warning(
-                "Not all reference files exist. Copying from current model output"
-            )
-            self.update_reference(outputs_missing_references, update_manifest=False)
+        self.manifest_cache = manifest_cache
+        self.hash_cache = hash_cache
+        self.hash_pool = hash_pool
+
+        # Lock protecting the reference files and manifest from concurrent updates
+        self.reference_lock = FileLock(f"{self.reference_file}.lock")
+        self._reference_signature = None
+        # Signatures of the reference files at the time their manifest entries were updated
+        self._updated_references = {}
+        # Signatures of the reference files copied from the output files by this check
+        self._copied_references = {}
+
+        self.dry_run = dry_run
+        self.comparison_plan = None
+        self._known_different = set()
 
-        # Make sure reference manifest is up to date
-        if not self.has_reference_file:
-            logger.warning(
-                "Manifest file does not exist. Generating manifest from reference files"
+    def setup(self):
+
+        with self.instrumentation.phase("setup"):
+            if self.dry_run:
+                # Only plan, so that dry runs do not write anything
+                self._load_references()
+                self.plan()
+                return
+
+            # Take a snapshot of the reference manifest and check all reference files ("KGO")
+            # exist. The manifest and reference files are only ever replaced atomically, so no
+            # lock is needed and read-only reference stores can be compared against
+            outputs_missing_references = self._load_references()
+
+            if outputs_missing_references or not self.has_reference_file:
+                with self.reference_lock.exclusive():
+                    # Another check may have created the references while we waited
+                    outputs_missing_references = self._load_references()
+
+                    if outputs_missing_references:
+                        logger.warning(
+                            "Not all reference files exist. Copying from current model output"
+                        )
+                        self.update_reference(
+                            outputs_missing_references, update_manifest=False
+                        )
+
+                    # Make sure reference manifest is up to date
+                    if not self.has_reference_file:
+                        logger.warning(
+                            "Manifest file does not exist. Generating manifest from reference files"
+                        )
+                        self.update_manifest()
+                        self.dump_and_maybe_commit("Initial commit")
+                    else:
+                        if outputs_missing_references:
+                            self.update_manifest(outputs_missing_references)
+                            self.dump_and_maybe_commit("Added new reference files")
+
+            # Set up the current manifest, hashing only the files that need it
+            plan = self.plan()
+            to_hash = [file for file in plan if file.strategy != SIZE_MISMATCH]
+            with self.io_limiter, self.instrumentation.phase("hash") as phase:
+                self._add_hashes(
+                    self.current_manifest,
+                    [file.filepath for file in to_hash],
+                    [file.fullpath for file in to_hash],
+                    phase=phase,
+                )
+
+            for file in plan.select(SIZE_MISMATCH):
+                self.current_manifest.data[file.filepath] = {
+                    "fullpath": file.fullpath,
+                    "hashes": {},
+                }
+                self._known_different.add(file.filepath)
+
+    def plan(self):
+        """
+        Plan how to compare each output file to its reference, choosing the strategy that is
+        estimated to read the fewest bytes. Only file metadata is read. The plan is stored in
+        comparison_plan and returned
+        """
+        with self.instrumentation.phase("plan"):
+            self.comparison_plan = plan_comparison(
+                self.output_files,
+                [os.path.join(self.base_dir, output) for output in self.output_files],
+                [
+                    os.path.join(self.reference_dir, output)
+                    for output in self.output_files
+                ],
+                YAMANIFEST_HASH_READ_LIMIT,
+                hash_cache=self.hash_cache,
+                hashfn=YAMANIFEST_HASH,
+                manifest_missing=not os.path.isfile(self.reference_file),
             )
-            self.update_manifest()
-            self.dump_and_maybe_commit("Initial commit")
-        else:
-            if outputs_missing_references:
-                self.update_manifest(outputs_missing_references)
-                self.dump_and_maybe_commit("Added new reference files")
-
-        # Set up the current manifest
-        self.current_manifest.add(
-            filepaths=self.output_files,
-            fullpaths=[
-                os.path.join(self.base_dir, output) for output in self.output_files
-            ],
-        )
+        return self.comparison_plan
+
+    def _load_references(self):
+        """
+        Load the reference manifest, if it exists, and return a list of the output files that
+        are missing reference files
+        """
+        self.has_reference_file = os.path.isfile(self.reference_file)
+        if self.has_reference_file:
+            with self.instrumentation.phase("load") as phase:
+                self._reference_signature = signature(self.reference_file)
+                if self.manifest_cache is None:
+                    self.reference_manifest.load()
+                    phase.read(self.reference_file)
+                else:
+                    self.manifest_cache.load(self.reference_manifest)
+
+        with self.instrumentation.phase("discover"):
+            return [
+                output
+                for output in self.output_files
+                if not os.path.isfile(os.path.join(self.reference_dir, output))
+            ]
 
     def update_reference(self, output_files=None, update_manifest=True):
         """
         Update the reference files and manifest. I.e. copy output files to the reference
         directory and optionally update the reference manifest for these new files. Overwrite
-        files in the manifest that already exists.
+        files in the manifest that already exists. When other checks may update the same
+        references, hold reference_lock from this call until dump_and_maybe_commit, e.g.::
+
+            with ri.reference_lock.exclusive():
+                ri.update_reference(files)
+                ri.dump_and_maybe_commit("Updated reference files")
 
         Parameters
         ----------
@@ -200,7 +352,7 @@ class BaseReproducibilityInfo:
         """
 
         if output_files is None:
-            output_files = self.current_manifest.data.keys()
+            output_files = list(self.current_manifest.data.keys())
         else:
             if type(output_files) is str:
                 output_files = [
@@ -212,16 +364,30 @@ class BaseReproducibilityInfo:
             os.path.join(self.reference_dir, output) for output in output_files
         ]
 
-        for output, reference in zip(outputs, references):
-            logger.info(f"(Over)writing reference file: {reference}")
-            if os.path.isfile(output):
-                os.makedirs(os.path.dirname(reference), exist_ok=True)
-                shutil.copy(output, reference)
-            else:
-                logger.warning(f"Output file {output} does not exists")
-
-        if update_manifest:
-            self.update_manifest(output_files=output_files)
+        with self.reference_lock.exclusive(), self.instrumentation.phase(
+            "update_reference"
+        ):
+            for output_file, output, reference in zip(
+                output_files, outputs, references
+            ):
+                logger.info(f"(Over)writing reference file: {reference}")
+                if os.path.isfile(output):
+                    with self.io_limiter, self.instrumentation.phase(
+                        "copy", file=output
+                    ) as phase:
+                        os.makedirs(os.path.dirname(reference), exist_ok=True)
+                        atomic_copy(output, reference)
+                        phase.read(output)
+                        phase.written(reference)
+                    self._copied_references[output_file] = signature(reference)
+                    # Don't trust the signature of a rewritten file to invalidate its hash
+                    if self.hash_cache is not None:
+                        self.hash_cache.invalidate(reference)
+                else:
+                    logger.warning(f"Output file {output} does not exists")
+
+            if update_manifest:
+                self.update_manifest(output_files=output_files)
 
     def update_manifest(self, output_files=None):
         """
@@ -244,29 +410,202 @@ class BaseReproducibilityInfo:
         references = [
             os.path.join(self.reference_dir, output) for output in output_files
         ]
-        self.reference_manifest.add(
-            filepaths=output_files, fullpaths=references, force=True
-        )
+        with self.reference_lock.exclusive():
+            signatures = {
+                output: signature(reference)
+                for output, reference in zip(output_files, references)
+            }
+            with self.io_limiter, self.instrumentation.phase(
+                "update_manifest"
+            ) as phase:
+                self._add_hashes(
+                    self.reference_manifest,
+                    output_files,
+                    references,
+                    force=True,
+                    phase=phase,
+                )
+            self._updated_references.update(signatures)
+
+            # Files known to differ from their old references without hashing must now be
+            # compared to their new references. Those copied from the output files by this
+            # check share the new reference hashes, the rest must be hashed
+            updated = [
+                output
+                for output in output_files
+                if output in self._known_different
+                and output in self.reference_manifest.data
+            ]
+            self._known_different.difference_update(updated)
+            to_hash = []
+            for output in updated:
+                if self._copied_references.get(output) == signatures[output]:
+                    self.current_manifest.data[output]["hashes"] = dict(
+                        self.reference_manifest.data[output]["hashes"]
+                    )
+                else:
+                    to_hash.append(output)
+            self._hash_current(to_hash)
+
+    def _hash_current(self, filepaths):
+        """
+        Hash output files already in the current manifest, e.g. that were known to differ
+        from their references without hashing
+
+        Parameters
+        ----------
+        filepaths: list
+            The filepaths in the current manifest to hash
+        """
+        if not filepaths:
+            return
+        with self.io_limiter, self.instrumentation.phase("hash") as phase:
+            self._add_hashes(
+                self.current_manifest,
+                filepaths,
+                [
+                    self.current_manifest.data[filepath]["fullpath"]
+                    for filepath in filepaths
+                ],
+                phase=phase,
+            )
+
+    def _add_hashes(self, manifest, filepaths, fullpaths, force=False, phase=None):
+        """
+        Add the hashes of files to a manifest, reusing hashes from the hash cache for files
+        that have not changed and hashing with the hash pool if provided.
+
+        Parameters
+        ----------
+        manifest: yamanifest.manifest.Manifest
+            The manifest to add the hashes to
+        filepaths: list
+            The filepaths to add to the manifest
+        fullpaths: list
+            The full paths to the files to hash
+        force: boolean, optional
+            Whether or not to overwrite hashes that already exist in the manifest
+        phase: morte.instrument.Phase, optional
+            The phase to record the bytes read from, and time spent hashing, each file in
+        """
+
+        to_hash = []
+        for filepath, fullpath in zip(filepaths, fullpaths):
+            hashes = None if self.hash_cache is None else self.hash_cache.get(fullpath)
+            if hashes is not None and YAMANIFEST_HASH in hashes:
+                manifest.data[filepath] = {"fullpath": fullpath, "hashes": hashes}
+            else:
+                to_hash.append((filepath, fullpath, signature(fullpath)))
+
+        if to_hash:
+            # Hash the files ourselves, rather than with manifest.add, so that each file is
+            # added to the hash cache (and any journal) as soon as it has been hashed, and the
+            # time spent hashing each file is known
+            fns = sorted(manifest.hashes)
+            if self.hash_pool is None:
+                pool = mp.Pool(processes=manifest.numproc)
+            else:
+                pool = nullcontext(self.hash_pool)
+            with pool as pool:
+                for idx, hashes, duration in pool.imap_unordered(
+                    _hash_file,
+                    [
+                        (idx, fullpath, fns)
+                        for idx, (_, fullpath, _) in enumerate(to_hash)
+                    ],
+                ):
+                    filepath, fullpath, sig = to_hash[idx]
+                    if phase is not None:
+                        phase.read(fullpath, limit=YAMANIFEST_HASH_READ_LIMIT)
+                        phase.timed(fullpath, duration)
+                    hashes = {fn: val for fn, val in hashes.items() if val is not None}
+                    if not force and filepath in manifest.data:
+                        hashes.update(manifest.data[filepath].get("hashes", {}))
+                    if hashes:
+                        manifest.data[filepath] = {
+                            "fullpath": fullpath,
+                            "hashes": hashes,
+                        }
+                        if self.hash_cache is not None:
+                            self.hash_cache.put(fullpath, hashes, sig=sig)
+                    else:
+                        manifest.data.pop(filepath, None)
 
     def compare(self):
         """
         Compare current and reference manifests and return list of files with differing hashes
         """
 
+        if self.dry_run:
+            raise RuntimeError("Cannot compare a dry run. See comparison_plan instead")
+
         if isinstance(self.reference_manifest, self.current_manifest.__class__):
             different = []
-            for file in self.current_manifest:
-                for fn, val in self.current_manifest.data[file]["hashes"].items():
-                    if fn not in self.reference_manifest.data[file]["hashes"]:
-                        different.append(file)
-                    if self.reference_manifest.data[file]["hashes"][fn] != val:
+            with self.instrumentation.phase("compare"):
+                for file in self.current_manifest:
+                    if file in self._known_different:
                         different.append(file)
+                        continue
+                    for fn, val in self.current_manifest.data[file]["hashes"].items():
+                        if fn not in self.reference_manifest.data[file]["hashes"]:
+                            different.append(file)
+                        if self.reference_manifest.data[file]["hashes"][fn] != val:
+                            different.append(file)
             return different
         else:
             return NotImplemented
 
     def dump_and_maybe_commit(self, commit_msg):
         """
-        Dump the reference manifest from yaml file and commit if in a github repo
+        Dump the reference manifest from yaml file and commit if in a github repo. Changes
+        made to the manifest file by other checks since it was loaded are kept, unless they
+        are for files updated by this check and those reference files have not been rewritten
+        by another check since
         """
-        self.reference_manifest.dump()
+        with self.reference_lock.exclusive(), self.instrumentation.phase(
+            "dump"
+        ) as phase:
+            if signature(self.reference_file) != self._reference_signature:
+                on_disk = Yamanifest(self.reference_file).load()
+                for filepath, sig in self._updated_references.items():
+                    reference = os.path.join(self.reference_dir, filepath)
+                    if (
+                        filepath in self.reference_manifest.data
+                        and signature(reference) == sig
+                    ):
+                        on_disk.data[filepath] = self.reference_manifest.data[filepath]
+                # Files known to differ from references that have since been changed by
+                # other checks must now be hashed
+                stale = [
+                    filepath
+                    for filepath in self._known_different
+                    if on_disk.data.get(filepath)
+                    != self.reference_manifest.data.get(filepath)
+                ]
+                self.reference_manifest.data = on_disk.data
+
+                self._known_different.difference_update(stale)
+                self._hash_current(stale)
+
+            with atomic_write(self.reference_file) as file:
+                file.write(
+                    yaml.dump_all(
+                        [self.reference_manifest.header, self.reference_manifest.data],
+                        default_flow_style=False,
+                    )
+                )
+            self._reference_signature = signature(self.reference_file)
+            self._updated_references.clear()
+            phase.written(self.reference_file)
+
+
+def _hash_file(args):
+    """
+    Return the hashes of a file for a list of hash functions and the time taken to compute
+    them. Takes a single tuple of (index, fullpath, hash functions) so that it can be mapped
+    over a multiprocessing pool
+    """
+    idx, fullpath, fns = args
+    start = time.perf_counter()
+    hashes = {fn: yamanifest_hash(fullpath, fn) for fn in fns}
+    return idx, hashes, time.perf_counter() - start
@@ -12,8 +12,8 @@ PBS_OUTPUT_FILE = "pbs.output"
 
 
 class PerformanceInfo(BasePerformanceInfo):
-    def __init__(self, base_dir, reference_file):
-        super().__init__(base_dir, reference_file)
+    def __init__(self, base_dir, reference_file, **kwargs):
+        super().__init__(base_dir, reference_file, **kwargs)
 
         self.PBS_output_file = PBS_OUTPUT_FILE
 
@@ -21,8 +21,8 @@ class PerformanceInfo(BasePerformanceInfo):
 
 
 class ReproducibilityInfo(BaseReproducibilityInfo):
-    def __init__(self, base_dir, reference_dir, manifest_file):
-        super().__init__(base_dir, reference_dir, manifest_file)
+    def __init__(self, base_dir, reference_dir, manifest_file, **kwargs):
+        super().__init__(base_dir, reference_dir, manifest_file, **kwargs)
 
         self.output_files = REPRO_OUTPUT_FILES
 
@@ -0,0 +1,213 @@
+# Copyright 2022 ACCESS-NRI and contributors. See the top-level COPYRIGHT file for details.
+# SPDX-License-Identifier: Apache-2.0
+
+"""
+Tools for choosing the cheapest way to compare each model output file to its reference
+"""
+
+import os
+
+# Strategies for comparing a file, in order of preference when their costs are equal:
+# - reuse a hash of the unchanged output file from the hash cache
+CACHED = "cached"
+# - the output and local reference files differ in size, so must differ
+SIZE_MISMATCH = "size-mismatch"
+# - hash the output file and compare to the reference manifest
+HASH = "hash"
+STRATEGIES = [CACHED, SIZE_MISMATCH, HASH]
+
+
+class FilePlan:
+    """
+    Class describing how a single output file will be compared to its reference
+    """
+
+    def __init__(
+        self,
+        filepath,
+        fullpath,
+        reference,
+        size,
+        reference_size,
+        costs,
+        reference_bytes=0,
+    ):
+        """
+        Initialise a FilePlan object.
+
+        Parameters
+        ----------
+        filepath : str
+            The filepath of the output in the manifests
+        fullpath : str
+            Path to the output file
+        reference : str
+            Path to the reference file
+        size : int or None
+            Size of the output file in bytes. None if the file does not exist
+        reference_size : int or None
+            Size of the reference file in bytes. None if the file does not exist
+        costs : dict
+            Estimated number of bytes read by each applicable strategy
+        reference_bytes : int, optional
+            Estimated number of bytes read and written to create the reference file and its
+            manifest entry before comparing, e.g. when the reference is missing
+        """
+
+        self.filepath = filepath
+        self.fullpath = fullpath
+        self.reference = reference
+        self.size = size
+        self.reference_size = reference_size
+        self.costs = costs
+        self.reference_bytes = reference_bytes
+
+        self.strategy = min(costs, key=lambda s: (costs[s], STRATEGIES.index(s)))
+
+    @property
+    def reference_missing(self):
+        return self.reference_size is None
+
+    @property
+    def bytes(self):
+        """
+        Estimated number of bytes read and written to compare this file, including
+        preparing its reference
+        """
+        return self.costs[self.strategy] + self.reference_bytes
+
+    def to_dict(self):
+        return {
+            "strategy": self.strategy,
+            "bytes": self.bytes,
+            "size": self.size,
+            "reference missing": self.reference_missing,
+            "reference bytes": self.reference_bytes,
+            "costs": dict(self.costs),
+        }
+
+
+class Plan:
+    """
+    Class describing how a set of output files will be compared to their references
+    """
+
+    def __init__(self, files):
+        """
+        Initialise a Plan object.
+
+        Parameters
+        ----------
+        files : list of FilePlan
+            The plans for each file
+        """
+        self.files = files
+
+    def __iter__(self):
+        for file in self.files:
+            yield file
+
+    def __len__(self):
+        return len(self.files)
+
+    @property
+    def bytes(self):
+        """
+        Estimated number of bytes read and written to compare all files
+        """
+        return sum(file.bytes for file in self.files)
+
+    def select(self, *strategies):
+        """
+        Return the plans for files that will be compared using the provided strategies
+        """
+        return [file for file in self.files if file.strategy in strategies]
+
+    def to_dict(self):
+        """
+        Return a dictionary summarising the plan, e.g. for a dry-run report
+        """
+        strategies = {}
+        for file in self.files:
+            strategies[file.strategy] = strategies.get(file.strategy, 0) + 1
+        return {
+            "bytes": self.bytes,
+            "strategies": strategies,
+            "files": {file.filepath: file.to_dict() for file in self.files},
+        }
+
+
+def plan_comparison(
+    filepaths,
+    fullpaths,
+    references,
+    hash_read_limit,
+    hash_cache=None,
+    hashfn=None,
+    manifest_missing=False,
+):
+    """
+    Choose the strategy for comparing each output file to its reference that is estimated
+    to read the fewest bytes. Only file metadata is read. The cost of first creating missing
+    reference files (copying the output) and their manifest entries (hashing the reference)
+    is also estimated.
+
+    Parameters
+    ----------
+    filepaths: list
+        The filepaths of the outputs in the manifests
+    fullpaths: list
+        Paths to the output files
+    references: list
+        Paths to the reference files
+    hash_read_limit: int
+        The maximum number of bytes read from a file to hash it
+    hash_cache: morte.cache.HashCache, optional
+        Cache of file hashes that can be reused
+    hashfn: str, optional
+        The hash function that cached hashes must include to be reused
+    manifest_missing: boolean, optional
+        Whether the reference manifest is missing, so that all references must be hashed
+    """
+
+    files = []
+    for filepath, fullpath, reference in zip(filepaths, fullpaths, references):
+        size = _size(fullpath)
+        reference_size = _size(reference)
+
+        costs = {HASH: 0 if size is None else min(size, hash_read_limit)}
+        if hash_cache is not None:
+            hashes = hash_cache.get(fullpath)
+            if hashes is not None and (hashfn is None or hashfn in hashes):
+                costs[CACHED] = 0
+        if None not in (size, reference_size) and size != reference_size:
+            costs[SIZE_MISMATCH] = 0
+
+        reference_bytes = 0
+        if reference_size is None:
+            if size is not None:
+                # Copy the output to the reference and hash the reference
+                reference_bytes = 2 * size + min(size, hash_read_limit)
+        elif manifest_missing:
+            reference_bytes = min(reference_size, hash_read_limit)
+
+        files.append(
+            FilePlan(
+                filepath,
+                fullpath,
+                reference,
+                size,
+                reference_size,
+                costs,
+                reference_bytes=reference_bytes,
+            )
+        )
+
+    return Plan(files)
+
+
+def _size(path):
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return None
@@ -0,0 +1,315 @@
+# Copyright 2022 ACCESS-NRI and contributors. See the top-level COPYRIGHT file for details.
+# SPDX-License-Identifier: Apache-2.0
+
+"""
+Tools for checking multiple experiments concurrently
+"""
+
+import os
+import time
+import logging
+import threading
+import multiprocessing as mp
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor
+
+import yaml
+
+from .cache import Journal
+from .models import get_model
+from .instrument import Instrumentation
+
+logger = logging.getLogger(__name__)
+log_handler = logging.StreamHandler()
+log_handler.setLevel(logging.INFO)
+log_format = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+log_handler.setFormatter(log_format)
+logger.addHandler(log_handler)
+
+CHECKS = ["performance", "reproducibility"]
+REQUIRED_KEYS = ["model", "base_dir"]
+
+
+def load_experiments(file):
+    """
+    Load a list of experiments to check from a yaml config file. The config should contain a
+    list of experiments, each with the form::
+
+        experiments:
+          - name: esm-pre-industrial
+            model: accessesm
+            base_dir: /path/to/experiment
+            performance:
+              reference_file: /path/to/performance.yaml
+            reproducibility:
+              reference_dir: /path/to/kgo
+              reference_file: /path/to/kgo_manifest.yaml
+
+    The model and base_dir entries are required. The name defaults to the name of base_dir
+    and either of the performance and reproducibility entries can be omitted. Relative paths
+    are relative to the directory containing the config file. Raises a ValueError if the
+    config is invalid.
+
+    Parameters
+    ----------
+    file: str
+        Path to the yaml config file
+    """
+
+    with open(file, "r") as f:
+        config = yaml.safe_load(f)
+
+    root = os.path.dirname(os.path.abspath(file))
+
+    def _path(path):
+        return os.path.join(root, os.path.expanduser(path))
+
+    experiments = []
+    for idx, experiment in enumerate(config["experiments"]):
+        missing = [key for key in REQUIRED_KEYS if key not in experiment]
+        if missing:
+            raise ValueError(
+                f"Experiment {experiment.get('name', idx)} in {file} is missing required "
+                f"entries: {', '.join(missing)}"
+            )
+        experiment = dict(experiment)
+        experiment.setdefault("name", os.path.basename(experiment["base_dir"]))
+        experiment["base_dir"] = _path(experiment["base_dir"])
+        for check in CHECKS:
+            if check in experiment:
+                experiment[check] = {
+                    key: _path(val) for key, val in experiment[check].items()
+                }
+        experiments.append(experiment)
+
+    _check_unique_names(experiments, f"Experiment names in {file}")
+
+    return experiments
+
+
+def check_experiment(
+    experiment,
+    instrumentation=None,
+    numproc=None,
+    io_limiter=None,
+    hash_cache=None,
+    dry_run=False,
+    hash_pool=None,
+):
+    """
+    Run the performance and/or reproducibility checks for a single experiment and return a
+    dictionary of the results
+
+    Parameters
+    ----------
+    experiment: dict
+        The experiment, as returned by load_experiments
+    instrumentation : morte.instrument.Instrumentation, optional
+        Object for recording the time and I/O of each phase of the checks
+    numproc : int, optional
+        The number of processes to use for hashing. If None, use one per CPU. Ignored if
+        hash_pool is provided
+    io_limiter : context manager, optional
+        Context manager entered around each I/O-heavy phase of the checks
+    hash_cache : morte.cache.HashCache, optional
+        Cache of file hashes to reuse, e.g. a morte.cache.Journal
+    dry_run : boolean, optional
+        If True, only plan how the reproducibility check would compare each file, without
+        copying, hashing or writing any files. The performance check is skipped
+    hash_pool : multiprocessing.pool.Pool, optional
+        Process pool to hash files with, e.g. shared between experiments
+    """
+
+    try:
+        model = get_model(experiment["model"])
+    except ValueError as e:
+        logger.exception(f"Could not load model for experiment {experiment['name']}")
+        return {
+            check: {"status": "error", "error": repr(e)}
+            for check in CHECKS
+            if check in experiment
+        }
+
+    results = {}
+    if "performance" in experiment and not dry_run:
+        try:
+            pi = model.PerformanceInfo(
+                experiment["base_dir"],
+                experiment["performance"]["reference_file"],
+                instrumentation=instrumentation,
+            )
+            results["performance"] = {"status": "collected", "info": pi.current_info}
+        except Exception as e:
+            logger.exception(
+                f"Performance check failed for experiment {experiment['name']}"
+            )
+            results["performance"] = {"status": "error", "error": repr(e)}
+
+    if "reproducibility" in experiment:
+        try:
+            ri = model.ReproducibilityInfo(
+                experiment["base_dir"],
+                experiment["reproducibility"]["reference_dir"],
+                experiment["reproducibility"]["reference_file"],
+                instrumentation=instrumentation,
+                numproc=numproc,
+                io_limiter=io_limiter,
+                hash_cache=hash_cache,
+                dry_run=dry_run,
+                hash_pool=hash_pool,
+            )
+            if dry_run:
+                results["reproducibility"] = {
+                    "status": "planned",
+                    "plan": ri.comparison_plan.to_dict(),
+                }
+            else:
+                different = sorted(set(ri.compare()))
+                results["reproducibility"] = {
+                    "status": "fail" if different else "pass",
+                    "different": different,
+                }
+        except Exception as e:
+            logger.exception(
+                f"Reproducibility check failed for experiment {experiment['name']}"
+            )
+            results["reproducibility"] = {"status": "error", "error": repr(e)}
+
+    return results
+
+
+class Runner:
+    """
+    Class for checking multiple experiments concurrently, sharing a bounded pool of hashing
+    processes and I/O slots between them. Files from all experiments being hashed at once
+    are hashed by the same pool, so no processes are left idle while any experiment has
+    files left to hash
+    """
+
+    def __init__(self, jobs=None, hash_procs=None, max_io=None, journal_dir=None):
+        """
+        Initialise a Runner object.
+
+        Parameters
+        ----------
+        jobs : int, optional
+            The maximum number of experiments to check at once. If None, use one per CPU
+        hash_procs : int, optional
+            The number of processes in the hashing pool shared between all experiments. If
+            None, use one per CPU
+        max_io : int, optional
+            The maximum number of I/O-heavy phases (hashing and copying) to run at once across
+            all experiments. If None, do not limit
+        journal_dir : str, optional
+            Directory in which to keep a journal of the hashes computed for each experiment, so
+            that an interrupted run can be resumed without rehashing unchanged files. Journals
+            are removed once their experiment has been checked without errors. If None, do not
+            keep journals
+        """
+
+        cpus = os.cpu_count() or 1
+        self.jobs = cpus if jobs is None else jobs
+        self.hash_procs = cpus if hash_procs is None else hash_procs
+        self.io_limiter = None if max_io is None else threading.BoundedSemaphore(max_io)
+        self.journal_dir = journal_dir
+
+        self.instrumentation = {}
+        self._origin = time.perf_counter()
+
+    def run(self, experiments, dry_run=False):
+        """
+        Check the provided experiments and return an aggregated report of the results
+
+        Parameters
+        ----------
+        experiments: list
+            The experiments, as returned by load_experiments
+        dry_run: boolean, optional
+            If True, only report how each file would be compared. See check_experiment
+        """
+
+        # Results, instrumentation and journals are all keyed by experiment name
+        _check_unique_names(experiments, "Experiment names")
+
+        # Start the hashing pool before any checks, rather than forking from their threads
+        hash_pool = None
+        if not dry_run and any("reproducibility" in e for e in experiments):
+            hash_pool = mp.Pool(processes=self.hash_procs)
+
+        def _check(experiment):
+            instrumentation = Instrumentation(origin=self._origin)
+            self.instrumentation[experiment["name"]] = instrumentation
+            hash_cache = None
+            if self.journal_dir is not None:
+                os.makedirs(self.journal_dir, exist_ok=True)
+                hash_cache = Journal(
+                    os.path.join(self.journal_dir, f"{experiment['name']}.journal")
+                )
+            logger.info(f"Checking experiment {experiment['name']}")
+            result = check_experiment(
+                experiment,
+                instrumentation=instrumentation,
+                io_limiter=self.io_limiter,
+                hash_cache=hash_cache,
+                dry_run=dry_run,
+                hash_pool=hash_pool,
+            )
+            # Keep the journal to resume from only if the check did not complete
+            if hash_cache is not None and not dry_run:
+                if all(check["status"] != "error" for check in result.values()):
+                    hash_cache.remove()
+            return result
+
+        with nullcontext() if hash_pool is None else hash_pool, ThreadPoolExecutor(
+            max_workers=self.jobs
+        ) as executor:
+            results = list(executor.map(_check, experiments))
+
+        report = {
+            "experiments": {
+                experiment["name"]: result
+                for experiment, result in zip(experiments, results)
+            }
+        }
+        report["summary"] = _summarise(report["experiments"])
+        return report
+
+    def trace_events(self):
+        """
+        Return the phases of all checked experiments as a list of events in the Trace Event
+        Format, with one thread per experiment
+        """
+        events = []
+        for tid, (name, instrumentation) in enumerate(self.instrumentation.items()):
+            events.append(
+                {
+                    "name": "thread_name",
+                    "ph": "M",
+                    "pid": os.getpid(),
+                    "tid": tid,
+                    "args": {"name": name},
+                }
+            )
+            events.extend(instrumentation.trace_events(tid=tid))
+        return events
+
+
+def _check_unique_names(experiments, description):
+    """
+    Raise a ValueError listing any experiment names that are not unique
+    """
+    names = [experiment["name"] for experiment in experiments]
+    duplicates = sorted({name for name in names if names.count(name) > 1})
+    if duplicates:
+        raise ValueError(f"{description} are not unique: {', '.join(duplicates)}")
+
+
+def _summarise(results):
+    """
+    Count the statuses of the checks across all experiments
+    """
+    summary = {}
+    for result in results.values():
+        for check in result.values():
+            summary[check["status"]] = summary.get(check["status"], 0) + 1
+    return summary
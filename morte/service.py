@@ -0,0 +1,225 @@
+# Copyright 2022 ACCESS-NRI and contributors. See the top-level COPYRIGHT file for details.
+# SPDX-License-Identifier: Apache-2.0
+
+"""
+A long-lived verification service that keeps reference manifests and file hashes in memory
+between checks, and a thin client for talking to it over a Unix socket
+"""
+
+import os
+import json
+import socket
+import logging
+import threading
+import socketserver
+
+from .models import get_model
+
+logger = logging.getLogger(__name__)
+log_handler = logging.StreamHandler()
+log_handler.setLevel(logging.INFO)
+log_format = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+log_handler.setFormatter(log_format)
+logger.addHandler(log_handler)
+
+DEFAULT_SOCKET = os.environ.get("MORTE_SOCKET", os.path.expanduser("~/.morte.sock"))
+
+
+class ServiceError(Exception):
+    "Exception for errors raised by the verification service"
+    pass
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    """
+    Handle a single newline-delimited json request
+    """
+
+    def handle(self):
+        try:
+            request = json.loads(self.rfile.readline())
+            response = {"result": self.server.dispatch(request)}
+        except Exception as e:
+            logger.exception("Request to verification service failed")
+            response = {"error": repr(e)}
+        self.wfile.write(json.dumps(response).encode() + b"\n")
+
+
+class Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    Class for serving compare and update requests over a Unix socket. Parsed reference
+    manifests and file hashes are kept in memory and reused until the files change
+    """
+
+    daemon_threads = True
+
+    def __init__(self, socket_path=None, numproc=None):
+        """
+        Initialise a Server object.
+
+        Parameters
+        ----------
+        socket_path : str, optional
+            Path to the Unix socket to listen on. If None, use $MORTE_SOCKET or ~/.morte.sock
+        numproc : int, optional
+            The number of processes to use for hashing. If None, use one per CPU
+        """
+        # Imported here so that clients do not pay for importing yamanifest
+        from .cache import HashCache, ManifestCache
+
+        self.socket_path = DEFAULT_SOCKET if socket_path is None else socket_path
+        self.numproc = numproc
+
+        self.manifest_cache = ManifestCache()
+        self.hash_cache = HashCache()
+
+        _remove_stale_socket(self.socket_path)
+        super().__init__(self.socket_path, _Handler)
+
+    def server_close(self):
+        super().server_close()
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+
+    def dispatch(self, request):
+        """
+        Run a request and return its result
+
+        Parameters
+        ----------
+        request: dict
+            The request. Must include an "op" key, one of "ping", "stats", "compare", "update"
+            or "shutdown"
+        """
+        op = request.pop("op")
+        if op == "ping":
+            return "pong"
+        elif op == "stats":
+            return {
+                "manifests": len(self.manifest_cache),
+                "hashes": len(self.hash_cache),
+            }
+        elif op == "compare":
+            ri = self._reproducibility_info(**request)
+            return sorted(set(ri.compare()))
+        elif op == "update":
+            output_files = request.pop("output_files", None)
+            ri = self._reproducibility_info(**request)
+            # Hold the lock throughout so that other checks cannot update the same references
+            # between updating the files and writing the manifest
+            with ri.reference_lock.exclusive():
+                ri.update_reference(output_files)
+                ri.dump_and_maybe_commit("Updated reference files")
+            return sorted(set(ri.compare()))
+        elif op == "shutdown":
+            threading.Thread(target=self.shutdown).start()
+            return "shutting down"
+        else:
+            raise ValueError(f"Unknown operation {op}")
+
+    def _reproducibility_info(self, model, base_dir, reference_dir, reference_file):
+        model = get_model(model)
+        return model.ReproducibilityInfo(
+            base_dir,
+            reference_dir,
+            reference_file,
+            numproc=self.numproc,
+            manifest_cache=self.manifest_cache,
+            hash_cache=self.hash_cache,
+        )
+
+
+class Client:
+    """
+    Class for sending requests to a running verification service
+    """
+
+    def __init__(self, socket_path=None, timeout=None):
+        """
+        Initialise a Client object.
+
+        Parameters
+        ----------
+        socket_path : str, optional
+            Path to the Unix socket the service is listening on. If None, use $MORTE_SOCKET or
+            ~/.morte.sock
+        timeout : float, optional
+            Timeout in seconds for each request. If None, wait indefinitely
+        """
+        self.socket_path = DEFAULT_SOCKET if socket_path is None else socket_path
+        self.timeout = timeout
+
+    def request(self, op, **kwargs):
+        """
+        Send a request to the service and return its result
+
+        Parameters
+        ----------
+        op: str
+            The operation to request
+        kwargs: dict
+            Arguments for the operation
+        """
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(self.timeout)
+            sock.connect(self.socket_path)
+            sock.sendall(json.dumps({"op": op, **kwargs}).encode() + b"\n")
+            with sock.makefile("rb") as f:
+                response = json.loads(f.readline())
+        if "error" in response:
+            raise ServiceError(response["error"])
+        return response["result"]
+
+    def ping(self):
+        """
+        Return True if the service is running
+        """
+        try:
+            return self.request("ping") == "pong"
+        except OSError:
+            return False
+
+    def compare(self, model, base_dir, reference_dir, reference_file):
+        """
+        Compare model output to reference files and return a list of files with differing
+        hashes. See BaseReproducibilityInfo for a description of the parameters
+        """
+        return self.request(
+            "compare",
+            model=model,
+            base_dir=str(base_dir),
+            reference_dir=str(reference_dir),
+            reference_file=str(reference_file),
+        )
+
+    def update(self, model, base_dir, reference_dir, reference_file, output_files=None):
+        """
+        Update the reference files and manifest from model output and return a list of files
+        that still differ. See BaseReproducibilityInfo.update_reference for a description of
+        output_files
+        """
+        return self.request(
+            "update",
+            model=model,
+            base_dir=str(base_dir),
+            reference_dir=str(reference_dir),
+            reference_file=str(reference_file),
+            output_files=output_files,
+        )
+
+    def shutdown(self):
+        """
+        Stop the service
+        """
+        return self.request("shutdown")
+
+
+def _remove_stale_socket(socket_path):
+    """
+    Remove a socket file left behind by a service that is no longer running
+    """
+    if not os.path.exists(socket_path):
+        return
+    if Client(socket_path, timeout=1).ping():
+        raise ServiceError(f"A service is already listening on {socket_path}")
+    os.remove(socket_path)
@@ -0,0 +1,153 @@
+# Copyright 2022 ACCESS-NRI and contributors. See the top-level COPYRIGHT file for details.
+# SPDX-License-Identifier: Apache-2.0
+
+import os
+import json
+import types
+
+import yaml
+import pytest
+
+import morte.models.base
+from morte.cli import main
+from morte.runner import Runner
+from morte.models.test import REPRO_OUTPUT_FILES
+
+
+def test_run(repro_dirs_same, tmp_path):
+    """
+    Test checking multiple experiments concurrently from the command line
+    """
+    reference_diff = tmp_path / "references_diff"
+    for file in REPRO_OUTPUT_FILES:
+        os.makedirs(os.path.dirname(reference_diff / file), exist_ok=True)
+        (reference_diff / file).write_bytes(os.urandom(1024))
+
+    config = {
+        "experiments": [
+            {
+                "name": "same",
+                "model": "testing",
+                "base_dir": str(repro_dirs_same[0]),
+                "reproducibility": {
+                    "reference_dir": str(repro_dirs_same[1]),
+                    "reference_file": str(repro_dirs_same[1] / "kgo_manifest.yaml"),
+                },
+            },
+            {
+                "name": "diff",
+                "model": "testing",
+                "base_dir": str(repro_dirs_same[0]),
+                "reproducibility": {
+                    "reference_dir": "references_diff",
+                    "reference_file": "references_diff/kgo_manifest.yaml",
+                },
+            },
+        ]
+    }
+    config_file = tmp_path / "config.yaml"
+    with open(config_file, "w") as file:
+        file.write(yaml.dump(config))
+
+    report_file = tmp_path / "report.yaml"
+    trace_file = tmp_path / "trace.json"
+    status = main(
+        [
+            "run",
+            str(config_file),
+            "--jobs",
+            "2",
+            "--hash-procs",
+            "2",
+            "--max-io",
+            "1",
+            "--output",
+            str(report_file),
+            "--trace",
+            str(trace_file),
+        ]
+    )
+    assert status == 1
+
+    with open(report_file, "r") as file:
+        report = yaml.safe_load(file)
+    assert report["summary"] == {"pass": 1, "fail": 1}
+    assert report["experiments"]["same"]["reproducibility"]["status"] == "pass"
+    assert set(report["experiments"]["diff"]["reproducibility"]["different"]) == set(
+        REPRO_OUTPUT_FILES
+    )
+
+    with open(trace_file, "r") as file:
+        trace = json.load(file)
+    threads = {
+        event["args"]["name"]
+        for event in trace["traceEvents"]
+        if event["name"] == "thread_name"
+    }
+    assert threads == {"same", "diff"}
+
+
+def test_run_duplicate_names(repro_dirs_same, tmp_path, capsys):
+    """
+    Test that experiments with the same name in different config files are rejected
+    """
+    experiment = {
+        "name": "x",
+        "model": "testing",
+        "base_dir": str(repro_dirs_same[0]),
+        "reproducibility": {
+            "reference_dir": str(repro_dirs_same[1]),
+            "reference_file": str(repro_dirs_same[1] / "kgo_manifest.yaml"),
+        },
+    }
+    configs = []
+    for name in ["a.yaml", "b.yaml"]:
+        configs.append(str(tmp_path / name))
+        with open(configs[-1], "w") as file:
+            file.write(yaml.dump({"experiments": [experiment]}))
+
+    assert main(["run", *configs]) == 2
+    assert "not unique: x" in capsys.readouterr().err
+
+
+@pytest.mark.parametrize("key", ["model", "base_dir"])
+def test_run_missing_keys(repro_dirs_same, tmp_path, capsys, key):
+    """
+    Test that experiments missing required entries are rejected
+    """
+    experiment = {"name": "x", "model": "testing", "base_dir": str(repro_dirs_same[0])}
+    del experiment[key]
+    config = str(tmp_path / "config.yaml")
+    with open(config, "w") as file:
+        file.write(yaml.dump({"experiments": [experiment]}))
+
+    assert main(["run", config]) == 2
+    assert f"Experiment x in {config} is missing required entries: {key}" in (
+        capsys.readouterr().err
+    )
+
+
+def test_run_shared_hash_pool(repro_dirs_same, tmp_path, monkeypatch):
+    """
+    Test that all experiments are hashed with the runner's process pool
+    """
+
+    def _pool(*args, **kwargs):
+        raise AssertionError("Checks should not start their own hashing pools")
+
+    monkeypatch.setattr(morte.models.base, "mp", types.SimpleNamespace(Pool=_pool))
+
+    experiments = [
+        {
+            "name": name,
+            "model": "testing",
+            "base_dir": str(repro_dirs_same[0]),
+            "reproducibility": {
+                "reference_dir": str(tmp_path / name),
+                "reference_file": str(tmp_path / name / "kgo_manifest.yaml"),
+            },
+        }
+        for name in ["a", "b", "c"]
+    ]
+    report = Runner(jobs=3, hash_procs=2).run(experiments)
+    assert report["summary"] == {"pass": 3}
@@ -0,0 +1,73 @@
+# Copyright 2022 ACCESS-NRI and contributors. See the top-level COPYRIGHT file for details.
+# SPDX-License-Identifier: Apache-2.0
+
+import os
+import json
+
+from morte.instrument import Instrumentation
+from morte.models.test import REPRO_OUTPUT_FILES, ReproducibilityInfo
+
+
+def test_phase(tmp_path):
+    """
+    Test that phases are timed and their I/O recorded
+    """
+    file = tmp_path / "file"
+    file.write_bytes(b"0" * 100)
+
+    completed = []
+    instrumentation = Instrumentation()
+    instrumentation.add_hook(completed.append)
+    with instrumentation.phase("outer"):
+        with instrumentation.phase("inner", file=str(file)) as phase:
+            phase.read(file)
+            phase.read(file, limit=10)
+            phase.written(file, tmp_path / "doesnotexist")
+            phase.timed(file, 2.0)
+
+    assert [phase.name for phase in completed] == ["inner", "outer"]
+    inner, outer = completed
+    assert inner.bytes_read == 110
+    assert inner.bytes_written == 100
+    assert inner.throughput == 210 / inner.duration
+    assert outer.duration >= inner.duration
+    assert inner.to_dict()["files"] == {
+        str(file): {"bytes": 210, "duration": 2.0, "throughput": 105.0},
+        str(tmp_path / "doesnotexist"): {"bytes": 0},
+    }
+
+    summary = instrumentation.summary()
+    assert summary["inner"]["count"] == 1
+    assert summary["inner"]["bytes read"] == 110
+    assert summary["outer"]["bytes read"] == 0
+
+
+def test_trace(repro_dirs_same, tmp_path):
+    """
+    Test that the phases of a check are written to a trace file
+    """
+    ri = ReproducibilityInfo(
+        repro_dirs_same[0],
+        repro_dirs_same[1],
+        str(repro_dirs_same[1] / "kgo_manifest.yaml"),
+    )
+    ri.compare()
+
+    trace_file = tmp_path / "trace.json"
+    ri.instrumentation.dump(trace_file)
+    with open(trace_file, "r") as f:
+        trace = json.load(f)
+
+    events = {event["name"]: event for event in trace["traceEvents"]}
+    assert {"setup", "load", "hash", "compare"} <= set(events)
+    assert all(event["ph"] == "X" for event in events.values())
+
+    expected = sum(
+        os.path.getsize(repro_dirs_same[0] / file) for file in REPRO_OUTPUT_FILES
+    )
+    assert events["hash"]["args"]["bytes read"] == expected
+    files = events["hash"]["args"]["files"]
+    assert set(files) == {str(repro_dirs_same[0] / file) for file in REPRO_OUTPUT_FILES}
+    assert sum(file["bytes"] for file in files.values()) == expected
+    assert all(file["duration"] > 0 for file in files.values())
+    assert trace["otherData"]["summary"]["hash"]["bytes read"] == expected
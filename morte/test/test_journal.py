@@ -0,0 +1,119 @@
+# Copyright 2022 ACCESS-NRI and contributors. See the top-level COPYRIGHT file for details.
+# SPDX-License-Identifier: Apache-2.0
+
+import os
+import shutil
+
+from morte.cache import Journal
+from morte.runner import Runner
+from morte.models.test import REPRO_OUTPUT_FILES, ReproducibilityInfo
+
+
+def _hashed_bytes(ri):
+    return ri.instrumentation.summary()["hash"]["bytes read"]
+
+
+def test_resume(repro_dirs_same, tmp_path):
+    """
+    Test that a check restarted with a journal only rehashes files that were not recorded
+    or have changed
+    """
+    base_dir = tmp_path / "output"
+    shutil.copytree(repro_dirs_same[0], base_dir)
+    reference_dir = repro_dirs_same[1]
+    reference_file = str(reference_dir / "kgo_manifest.yaml")
+    journal_file = tmp_path / "check.journal"
+
+    ri = ReproducibilityInfo(
+        base_dir, reference_dir, reference_file, hash_cache=Journal(journal_file)
+    )
+    assert not ri.compare()
+    with open(journal_file, "r") as f:
+        lines = f.readlines()
+    assert len(lines) == len(REPRO_OUTPUT_FILES)
+
+    # Simulate a check that was interrupted while writing the record for the last file
+    with open(journal_file, "w") as f:
+        f.writelines(lines[:-1])
+        f.write(lines[-1][:10])
+
+    ri = ReproducibilityInfo(
+        base_dir, reference_dir, reference_file, hash_cache=Journal(journal_file)
+    )
+    assert not ri.compare()
+    assert _hashed_bytes(ri) == os.path.getsize(base_dir / REPRO_OUTPUT_FILES[-1])
+
+    # Nothing needs rehashing, until a file changes
+    ri = ReproducibilityInfo(
+        base_dir, reference_dir, reference_file, hash_cache=Journal(journal_file)
+    )
+    assert _hashed_bytes(ri) == 0
+
+    changed = base_dir / REPRO_OUTPUT_FILES[0]
+    with open(changed, "r+b") as f:
+        f.write(b"changed")
+    ri = ReproducibilityInfo(
+        base_dir, reference_dir, reference_file, hash_cache=Journal(journal_file)
+    )
+    assert ri.compare() == REPRO_OUTPUT_FILES[:1]
+    assert _hashed_bytes(ri) == os.path.getsize(changed)
+
+    # Superseded records are dropped when the journal is reopened
+    Journal(journal_file)
+    with open(journal_file, "r") as f:
+        assert len(f.readlines()) == len(REPRO_OUTPUT_FILES)
+
+
+def test_invalidate(repro_dirs_same, tmp_path):
+    """
+    Test that cached hashes of rewritten reference files are not reused, including after
+    the journal is reopened
+    """
+    reference_dir = tmp_path / "references"
+    reference_file = str(reference_dir / "kgo_manifest.yaml")
+    journal_file = tmp_path / "check.journal"
+
+    ri = ReproducibilityInfo(
+        repro_dirs_same[0],
+        reference_dir,
+        reference_file,
+        hash_cache=Journal(journal_file),
+    )
+    reference = str(reference_dir / REPRO_OUTPUT_FILES[0])
+    assert ri.hash_cache.get(reference) is not None
+
+    ri.update_reference(REPRO_OUTPUT_FILES[0], update_manifest=False)
+    assert ri.hash_cache.get(reference) is None
+    assert Journal(journal_file).get(reference) is None
+
+
+def test_remove_on_completion(repro_dirs_same, tmp_path):
+    """
+    Test that the runner removes the journal of an experiment once it has been checked, but
+    keeps it if the check did not complete
+    """
+    reference_dir = tmp_path / "references"
+    shutil.copytree(repro_dirs_same[1], reference_dir)
+    reference_file = reference_dir / "kgo_manifest.yaml"
+    journal_dir = tmp_path / "journals"
+    experiment = {
+        "name": "experiment",
+        "model": "testing",
+        "base_dir": str(repro_dirs_same[0]),
+        "reproducibility": {
+            "reference_dir": str(reference_dir),
+            "reference_file": str(reference_file),
+        },
+    }
+
+    report = Runner(journal_dir=journal_dir).run([experiment])
+    assert report["summary"] == {"pass": 1}
+    assert os.listdir(journal_dir) == []
+
+    # The journal of an interrupted check is kept if the resumed check errors
+    journal = Journal(journal_dir / "experiment.journal")
+    journal.put(str(repro_dirs_same[0] / REPRO_OUTPUT_FILES[0]), {"hash": "value"})
+    reference_file.write_text("{")
+    report = Runner(journal_dir=journal_dir).run([experiment])
+    assert report["summary"] == {"error": 1}
+    assert os.listdir(journal_dir) == ["experiment.journal"]
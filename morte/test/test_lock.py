@@ -0,0 +1,199 @@
+# Copyright 2022 ACCESS-NRI and contributors. See the top-level COPYRIGHT file for details.
+# SPDX-License-Identifier: Apache-2.0
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from yamanifest import Manifest as Yamanifest
+
+from morte.lock import FileLock, atomic_write
+from morte.models.test import REPRO_OUTPUT_FILES, ReproducibilityInfo
+
+
+def test_file_lock(tmp_path):
+    """
+    Test that exclusive locks exclude other lock holders and shared locks do not
+    """
+    path = str(tmp_path / "file.lock")
+    first, second = FileLock(path), FileLock(path)
+
+    acquired = threading.Event()
+
+    def _acquire(shared):
+        acquired.clear()
+        with second.shared() if shared else second.exclusive():
+            acquired.set()
+
+    with first.exclusive():
+        with first.exclusive():  # Reentrant
+            thread = threading.Thread(target=_acquire, args=(True,))
+            thread.start()
+            assert not acquired.wait(0.2)
+    thread.join(5)
+    assert acquired.is_set()
+
+    with first.shared():
+        thread = threading.Thread(target=_acquire, args=(True,))
+        thread.start()
+        thread.join(5)
+        assert acquired.is_set()
+
+
+def test_atomic_write(tmp_path):
+    """
+    Test that a failed atomic write leaves the original file untouched
+    """
+    path = tmp_path / "file"
+    with atomic_write(path) as f:
+        f.write("original")
+
+    with pytest.raises(RuntimeError):
+        with atomic_write(path) as f:
+            f.write("partial")
+            raise RuntimeError
+
+    assert path.read_text() == "original"
+    assert os.listdir(tmp_path) == ["file"]
+
+
+def test_permissions(tmp_path):
+    """
+    Test that new lock files and written files have the permissions a new file would have,
+    and that rewritten files keep their permissions
+    """
+    umask = os.umask(0o022)
+    try:
+        with FileLock(str(tmp_path / "file.lock")).exclusive():
+            pass
+        assert os.stat(tmp_path / "file.lock").st_mode & 0o777 == 0o644
+
+        path = tmp_path / "file"
+        with atomic_write(path) as f:
+            f.write("original")
+        assert os.stat(path).st_mode & 0o777 == 0o644
+
+        os.chmod(path, 0o664)
+        with atomic_write(path) as f:
+            f.write("rewritten")
+        assert os.stat(path).st_mode & 0o777 == 0o664
+    finally:
+        os.umask(umask)
+
+
+@pytest.mark.skipif(
+    os.geteuid() == 0, reason="Read-only directories are writable by root"
+)
+def test_read_only_references(repro_dirs_same, tmp_path):
+    """
+    Test that checks can be compared against a read-only reference store
+    """
+    reference_dir = tmp_path / "references"
+    reference_file = str(reference_dir / "kgo_manifest.yaml")
+    ReproducibilityInfo(repro_dirs_same[0], reference_dir, reference_file)
+
+    modes = {}
+    for root, dirs, _ in os.walk(reference_dir):
+        for directory in [root] + [os.path.join(root, d) for d in dirs]:
+            modes[directory] = os.stat(directory).st_mode
+    os.remove(f"{reference_file}.lock")
+    for directory, mode in modes.items():
+        os.chmod(directory, mode & ~0o222)
+    try:
+        ri = ReproducibilityInfo(repro_dirs_same[0], reference_dir, reference_file)
+        assert not ri.compare()
+    finally:
+        for directory, mode in modes.items():
+            os.chmod(directory, mode)
+
+
+def test_concurrent_initial_runs(repro_dirs_same, tmp_path):
+    """
+    Test that concurrent checks against the same empty reference store create the reference
+    files and manifest once and all pass
+    """
+    reference_dir = tmp_path / "references"
+    reference_file = str(reference_dir / "kgo_manifest.yaml")
+
+    def _check(_):
+        ri = ReproducibilityInfo(
+            repro_dirs_same[0], reference_dir, reference_file, numproc=1
+        )
+        return ri.compare()
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        assert not any(executor.map(_check, range(4)))
+
+    manifest = Yamanifest(reference_file).load()
+    assert set(manifest.data) == set(REPRO_OUTPUT_FILES)
+
+
+def test_concurrent_updates(repro_dirs_same, tmp_path):
+    """
+    Test that concurrent updates of different reference files are all kept in the manifest
+    """
+    reference_dir = tmp_path / "references"
+    reference_file = str(reference_dir / "kgo_manifest.yaml")
+    for file in REPRO_OUTPUT_FILES:
+        os.makedirs(os.path.dirname(reference_dir / file), exist_ok=True)
+        (reference_dir / file).write_bytes(os.urandom(1024))
+
+    first, second = [
+        ReproducibilityInfo(repro_dirs_same[0], reference_dir, reference_file)
+        for _ in range(2)
+    ]
+    assert set(first.compare()) == set(REPRO_OUTPUT_FILES)
+
+    first.update_reference(REPRO_OUTPUT_FILES[0])
+    first.dump_and_maybe_commit("Update first file")
+    second.update_reference(REPRO_OUTPUT_FILES[1:])
+    second.dump_and_maybe_commit("Update other files")
+
+    assert not second.compare()
+    ri = ReproducibilityInfo(repro_dirs_same[0], reference_dir, reference_file)
+    assert not ri.compare()
+
+
+def test_concurrent_updates_same_file(tmp_path):
+    """
+    Test that a check that updated a reference file that was then rewritten by another
+    check does not write its stale hash back to the manifest
+    """
+    base_dirs = [tmp_path / "output_a", tmp_path / "output_b"]
+    for base_dir in base_dirs:
+        for file in REPRO_OUTPUT_FILES:
+            os.makedirs(os.path.dirname(base_dir / file), exist_ok=True)
+            (base_dir / file).write_bytes(os.urandom(1024))
+    reference_dir = tmp_path / "references"
+    reference_file = str(reference_dir / "kgo_manifest.yaml")
+
+    a, b = [
+        ReproducibilityInfo(base_dir, reference_dir, reference_file)
+        for base_dir in base_dirs
+    ]
+    assert set(b.compare()) == set(REPRO_OUTPUT_FILES)
+
+    a.update_reference(REPRO_OUTPUT_FILES[0])
+    b.update_reference(REPRO_OUTPUT_FILES[0])
+    b.dump_and_maybe_commit("Update first file from b")
+    a.dump_and_maybe_commit("Update first file from a")
+
+    ri = ReproducibilityInfo(base_dirs[1], reference_dir, reference_file)
+    assert ri.compare() == REPRO_OUTPUT_FILES[1:]
+
+    # Holding the lock from the update through the dump serialises the updates
+    def _update(ri):
+        with ri.reference_lock.exclusive():
+            ri.update_reference()
+            ri.dump_and_maybe_commit("Update all files")
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        list(executor.map(_update, [a, b]))
+
+    final = [
+        ReproducibilityInfo(base_dir, reference_dir, reference_file).compare()
+        for base_dir in base_dirs
+    ]
+    assert sorted(map(len, final)) == [0, len(REPRO_OUTPUT_FILES)]
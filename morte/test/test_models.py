@@ -0,0 +1,117 @@
+# Copyright 2022 ACCESS-NRI and contributors. See the top-level COPYRIGHT file for details.
+# SPDX-License-Identifier: Apache-2.0
+
+import sys
+import types
+import importlib.metadata
+import subprocess
+
+import pytest
+
+import morte
+import morte.models
+from morte.models import available_models, get_model, register_model
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    """
+    Restore the model registry after the test
+    """
+    monkeypatch.setattr(morte.models, "_models", dict(morte.models._models))
+    monkeypatch.setattr(
+        morte.models, "_entry_points_loaded", morte.models._entry_points_loaded
+    )
+
+
+def test_lazy_import():
+    """
+    Test that importing morte and listing the models does not import the models or their
+    dependencies, or scan the installed distributions for entry points, and that models are
+    imported on attribute access
+    """
+    code = (
+        "import sys, morte; morte.available_models(); "
+        "assert 'morte.models.accessesm' not in sys.modules; "
+        "assert 'yamanifest' not in sys.modules; "
+        "assert 'yaml' not in sys.modules; "
+        "assert 'importlib.metadata' not in sys.modules; "
+        "morte.available_models(entry_points=True); "
+        "assert 'importlib.metadata' in sys.modules; "
+        "assert morte.models.accessesm.ReproducibilityInfo"
+    )
+    subprocess.run([sys.executable, "-c", code], check=True)
+
+
+def test_get_model(registry):
+    """
+    Test getting models from the registry
+    """
+    from morte.models import accessesm, test
+
+    assert {"accessesm", "testing"} <= set(available_models())
+    assert get_model("accessesm") is accessesm
+    assert morte.accessesm is accessesm
+    assert morte.testing is test
+    assert morte.models.accessesm is accessesm
+    assert morte.models.testing is test
+
+    with pytest.raises(ValueError):
+        get_model("doesnotexist")
+
+
+def test_register_model(registry):
+    """
+    Test registering models by import path and by object
+    """
+    register_model("by_path", "morte.models.test")
+    register_model("by_attribute", "morte.models:test")
+    model = types.SimpleNamespace(PerformanceInfo=None, ReproducibilityInfo=None)
+    register_model("by_object", model)
+
+    from morte.models import test
+
+    assert get_model("by_path") is test
+    assert get_model("by_attribute") is test
+    assert get_model("by_object") is model
+    assert {"by_path", "by_attribute", "by_object"} <= set(available_models())
+
+
+@pytest.mark.parametrize("select", [True, False], ids=["select", "dict"])
+def test_entry_points(registry, monkeypatch, select):
+    """
+    Test that models declared as entry points are only discovered when requested, both with
+    the selectable entry points of Python >= 3.10 and the dictionary of earlier versions
+    """
+    monkeypatch.setattr(morte.models, "_entry_points_loaded", False)
+
+    eps = [
+        importlib.metadata.EntryPoint(
+            "by_entry_point", "morte.models.test", morte.models.ENTRY_POINT_GROUP
+        ),
+        importlib.metadata.EntryPoint(
+            "other_group", "morte.models.test", "other.group"
+        ),
+    ]
+
+    def _entry_points():
+        if select:
+            return types.SimpleNamespace(
+                select=lambda group: [ep for ep in eps if ep.group == group]
+            )
+        groups = {}
+        for ep in eps:
+            groups.setdefault(ep.group, []).append(ep)
+        return groups
+
+    monkeypatch.setattr(importlib.metadata, "entry_points", _entry_points)
+
+    assert "by_entry_point" not in available_models()
+    assert "by_entry_point" in available_models(entry_points=True)
+    assert "other_group" not in available_models(entry_points=True)
+
+    from morte.models import test
+
+    monkeypatch.setattr(morte.models, "_entry_points_loaded", False)
+    morte.models._models.pop("by_entry_point")
+    assert get_model("by_entry_point") is test
@@ -0,0 +1,132 @@
+# Copyright 2022 ACCESS-NRI and contributors. See the top-level COPYRIGHT file for details.
+# SPDX-License-Identifier: Apache-2.0
+
+import os
+import shutil
+
+import pytest
+
+from morte.cache import HashCache
+from morte.planner import CACHED, HASH, SIZE_MISMATCH, plan_comparison
+from morte.models.test import REPRO_OUTPUT_FILES, ReproducibilityInfo
+
+
+def test_plan_comparison(tmp_path):
+    """
+    Test that the cheapest strategy is chosen for each file
+    """
+    for name, size in [
+        ("output1", 100),
+        ("output2", 100),
+        ("output3", 100),
+        ("reference1", 50),
+        ("reference2", 100),
+        ("reference3", 100),
+    ]:
+        (tmp_path / name).write_bytes(os.urandom(size))
+
+    hash_cache = HashCache()
+    hash_cache.put(tmp_path / "output3", {"binhash-nomtime": "abc"})
+
+    plan = plan_comparison(
+        ["file1", "file2", "file3", "file4"],
+        [tmp_path / f"output{i}" for i in range(1, 5)],
+        [tmp_path / f"reference{i}" for i in range(1, 5)],
+        hash_read_limit=60,
+        hash_cache=hash_cache,
+        hashfn="binhash-nomtime",
+    )
+
+    assert [file.strategy for file in plan] == [SIZE_MISMATCH, HASH, CACHED, HASH]
+    assert [file.bytes for file in plan] == [0, 60, 0, 0]
+    assert plan.bytes == 60
+    assert plan.to_dict()["strategies"] == {SIZE_MISMATCH: 1, HASH: 2, CACHED: 1}
+
+
+def test_dry_run(repro_dirs_same, tmp_path):
+    """
+    Test that a dry run plans the comparison without writing any references
+    """
+    reference_dir = tmp_path / "references"
+    ri = ReproducibilityInfo(
+        repro_dirs_same[0],
+        reference_dir,
+        str(reference_dir / "kgo_manifest.yaml"),
+        dry_run=True,
+    )
+    assert not os.path.exists(reference_dir)
+
+    # The outputs are copied to the references, then the outputs and references are hashed
+    size = sum(
+        os.path.getsize(repro_dirs_same[0] / file) for file in REPRO_OUTPUT_FILES
+    )
+    plan = ri.comparison_plan.to_dict()
+    assert plan["strategies"] == {HASH: len(REPRO_OUTPUT_FILES)}
+    assert all(file["reference missing"] for file in plan["files"].values())
+    assert plan["bytes"] == 4 * size
+
+    with pytest.raises(RuntimeError):
+        ri.compare()
+    assert not os.path.exists(reference_dir)
+
+    # Without a manifest, the existing references are hashed too
+    shutil.copytree(repro_dirs_same[0], reference_dir)
+    ri = ReproducibilityInfo(
+        repro_dirs_same[0],
+        reference_dir,
+        str(reference_dir / "kgo_manifest.yaml"),
+        dry_run=True,
+    )
+    plan = ri.comparison_plan.to_dict()
+    assert not any(file["reference missing"] for file in plan["files"].values())
+    assert plan["bytes"] == 2 * size
+    assert not os.path.exists(reference_dir / "kgo_manifest.yaml")
+
+
+def test_size_mismatch(repro_dirs_same, tmp_path):
+    """
+    Test that files that differ in size from their references are not hashed
+    """
+    reference_dir = tmp_path / "references"
+    for file in REPRO_OUTPUT_FILES:
+        os.makedirs(os.path.dirname(reference_dir / file), exist_ok=True)
+        (reference_dir / file).write_bytes(os.urandom(1024))
+
+    ri = ReproducibilityInfo(
+        repro_dirs_same[0], reference_dir, str(reference_dir / "kgo_manifest.yaml")
+    )
+    assert set(ri.compare()) == set(REPRO_OUTPUT_FILES)
+    assert ri.instrumentation.summary()["hash"]["bytes read"] == 0
+
+    ri.update_reference(REPRO_OUTPUT_FILES[:1])
+    assert ri.compare() == REPRO_OUTPUT_FILES[1:]
+    ri.update_reference()
+    assert not ri.compare()
+
+
+def test_size_mismatch_update_manifest(repro_dirs_same, tmp_path):
+    """
+    Test that files that differed in size from their references are compared again once
+    the manifest is updated separately from the reference files
+    """
+    reference_dir = tmp_path / "references"
+    for file in REPRO_OUTPUT_FILES:
+        os.makedirs(os.path.dirname(reference_dir / file), exist_ok=True)
+        (reference_dir / file).write_bytes(os.urandom(1024))
+
+    ri = ReproducibilityInfo(
+        repro_dirs_same[0], reference_dir, str(reference_dir / "kgo_manifest.yaml")
+    )
+    assert set(ri.compare()) == set(REPRO_OUTPUT_FILES)
+
+    ri.update_reference(REPRO_OUTPUT_FILES[:1], update_manifest=False)
+    ri.update_manifest(REPRO_OUTPUT_FILES[:1])
+    assert ri.compare() == REPRO_OUTPUT_FILES[1:]
+
+    # References not copied by this check must be hashed to compare
+    shutil.copy(
+        repro_dirs_same[0] / REPRO_OUTPUT_FILES[1],
+        reference_dir / REPRO_OUTPUT_FILES[1],
+    )
+    ri.update_manifest(REPRO_OUTPUT_FILES[1:])
+    assert ri.compare() == REPRO_OUTPUT_FILES[2:]
@@ -0,0 +1,89 @@
+# Copyright 2022 ACCESS-NRI and contributors. See the top-level COPYRIGHT file for details.
+# SPDX-License-Identifier: Apache-2.0
+
+import os
+import sys
+import json
+import socket
+import threading
+import subprocess
+
+import pytest
+
+from morte.models.test import REPRO_OUTPUT_FILES
+
+if not hasattr(socket, "AF_UNIX"):
+    pytest.skip("Unix sockets are not available", allow_module_level=True)
+
+from morte.cli import main  # noqa: E402
+from morte.service import Client, Server, ServiceError  # noqa: E402
+
+
+@pytest.fixture
+def client(tmp_path):
+    """Client for a verification service running in a background thread"""
+    socket_path = str(tmp_path / "morte.sock")
+    server = Server(socket_path)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    yield Client(socket_path, timeout=60)
+    server.shutdown()
+    server.server_close()
+    thread.join()
+
+
+def test_compare_and_update(repro_dirs_same, tmp_path, client):
+    """
+    Test comparing and updating references through the verification service
+    """
+    assert client.ping()
+
+    reference_dir = tmp_path / "references"
+    for file in REPRO_OUTPUT_FILES:
+        os.makedirs(os.path.dirname(reference_dir / file), exist_ok=True)
+        (reference_dir / file).write_bytes(os.urandom(1024))
+    reference_file = reference_dir / "kgo_manifest.yaml"
+
+    args = ("testing", repro_dirs_same[0], reference_dir, reference_file)
+    assert set(client.compare(*args)) == set(REPRO_OUTPUT_FILES)
+    # Second request is answered from the in-memory manifest and hashes
+    assert set(client.compare(*args)) == set(REPRO_OUTPUT_FILES)
+    assert client.request("stats")["manifests"] == 1
+
+    assert client.update(*args, output_files=REPRO_OUTPUT_FILES[:1]) == sorted(
+        REPRO_OUTPUT_FILES[1:]
+    )
+    assert client.compare(*args) == sorted(REPRO_OUTPUT_FILES[1:])
+    assert client.update(*args) == []
+    assert client.compare(*args) == []
+
+
+def test_error(client):
+    """
+    Test that errors in the service are raised in the client
+    """
+    with pytest.raises(ServiceError):
+        client.request("doesnotexist")
+
+
+def test_cli(repro_dirs_same, client, capsys):
+    """
+    Test that the command line client writes json results without importing yaml
+    """
+    args = [
+        "testing",
+        str(repro_dirs_same[0]),
+        str(repro_dirs_same[1]),
+        str(repro_dirs_same[1] / "kgo_manifest.yaml"),
+        "--socket",
+        client.socket_path,
+    ]
+    assert main(["compare", *args]) == 0
+    assert json.loads(capsys.readouterr().out) == {"different": []}
+
+    code = (
+        "import sys, morte.cli, morte.service; "
+        "assert 'yaml' not in sys.modules; "
+        "assert 'yamanifest' not in sys.modules"
+    )
+    subprocess.run([sys.executable, "-c", code], check=True)